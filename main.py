@@ -2,4 +2,6 @@
 import sys
 
 from package import app
-sys.exit(app.run())    
+
+if __name__ == '__main__':
+    sys.exit(app.run())
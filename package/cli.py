@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Headless command line interface, no Qt required.
+
+    python -m package.cli convert INPUT OUTPUT [--header-size 512] [--initial 4]
+                                               [--rcv-field Inline3D] [--dsf int32]
+                                               [--dt 1000] [--workers N] [--readers N] [--layout PATTERN]
+                                               [--segy-format float32] [--little-endian]
+    python -m package.cli index ARCHIVE [--start TIME] [--end TIME] [--rcv N ...] [--code N ...]
+    python -m package.cli extract ARCHIVE OUTFILE --start TIME --end TIME [--rcv N ...] [--code N ...]
+    python -m package.cli detect ARCHIVE --nsta N --nlta N --on X --off X [--coincidence N]
+                                         [--method recursive_sta_lta] [--start TIME] [--end TIME]
+    python -m package.cli pick SEGY_DIR --nsta N --nlta N --p-thres X --s-thres X [--workers N] [--output PICKS.npz]
+"""
+
+import os
+import sys
+import argparse
+
+from .utils.layout import DEFAULT_LAYOUT
+
+
+def convert(opts):
+
+    from .psmodule.psconvert import SegyConverter
+
+    args = {'header_size': opts.header_size,
+            'initial': opts.initial,
+            'rcv_field': opts.rcv_field,
+            'dsf': opts.dsf,
+            'dt': opts.dt,
+            'workers': opts.workers,
+            'readers': opts.readers,
+            'layout': opts.layout,
+            'segy_format': opts.segy_format,
+            'segy_endian': 'little' if opts.little_endian else 'big'}
+
+    def label(text):
+        if not opts.quiet:
+            print(text, flush = True)
+
+    converter = SegyConverter(opts.input, opts.output, args, label = label)
+
+    try:
+        completed = converter.run()
+    except KeyboardInterrupt:
+        converter.stop()
+        completed = False
+
+    if completed:
+        print('SEG-Y files conversion completed.')
+        return 0
+
+    print('SEG-Y files conversion stopped.')
+    return 1
+
+
+def index(opts):
+
+    from .psmodule.psindex import SegyArchiveIndex
+
+    archive = SegyArchiveIndex(opts.archive)
+    scanned = archive.update()
+
+    if not opts.quiet:
+        print(str(scanned) + ' files scanned, ' + str(len(archive.files['name'])) + ' files indexed.', flush = True)
+
+    if opts.start or opts.end or opts.rcv or opts.code:
+        for filename, trace in archive.query(opts.start, opts.end, opts.rcv, opts.code):
+            print(filename + ' ' + str(trace))
+
+    return 0
+
+
+def extract(opts):
+
+    from .psmodule.psindex import extractSegyWindow
+
+    try:
+        Data, SH, STH = extractSegyWindow(opts.archive, opts.start, opts.end, opts.rcv, opts.code,
+                                          outfile = opts.output, fill = opts.fill)
+    except ValueError as e:
+        print(str(e))
+        return 1
+
+    if not opts.quiet:
+        print(str(Data.shape[1]) + ' traces of ' + str(Data.shape[0]) + ' samples written to ' + opts.output)
+
+    return 0
+
+
+def detect(opts):
+
+    from .psmodule.psdetect import detectSegyArchive
+
+    triggers, events = detectSegyArchive(opts.archive, opts.nsta, opts.nlta, opts.on, opts.off,
+                                         coincidence = opts.coincidence, method = opts.method,
+                                         start = opts.start, end = opts.end, receivers = opts.rcv,
+                                         codes = opts.code, chunk = opts.chunk)
+
+    if opts.triggers:
+        for t in triggers:
+            print(str(t['on']) + ' ' + str(t['off']) + ' ' + str(t['rcv']) + ' ' + str(t['code']) + ' ' + '%.2f' % t['peak'])
+
+    for e in events:
+        print(str(e['time']) + ' ' + '%.3f' % e['duration'] + ' ' + str(e['coincidence']) + ' ' +
+              ','.join(str(rcv) for rcv in e['rcvs']))
+
+    if not opts.quiet:
+        print(str(len(triggers)) + ' triggers, ' + str(len(events)) + ' events.', flush = True)
+
+    return 0
+
+
+def pick(opts):
+
+    import numpy as np
+    from .psmodule.psdetect import pickSegyDirectory
+    from .psmodule.pspicker import PHASES
+
+    files, picks = pickSegyDirectory(opts.archive, opts.nsta, opts.nlta, opts.p_thres, opts.s_thres,
+                                     method = opts.method, workers = opts.workers, threads = opts.threads)
+
+    if opts.output:
+        np.savez(opts.output, files = np.array(files), picks = picks)
+    else:
+        for p in picks:
+            print(os.path.basename(files[p['file']]) + ' ' + str(p['trace']) + ' ' + str(p['sample']) + ' ' +
+                  PHASES[p['phase']] + ' ' + '%.2f' % p['cf'])
+
+    if not opts.quiet:
+        print(str(len(picks)) + ' picks in ' + str(len(files)) + ' files.', flush = True)
+
+    return 0
+
+
+def build_parser():
+
+    parser = argparse.ArgumentParser(prog = 'python -m package.cli',
+                                     description = 'DeepListen SEG-Y converter')
+
+    commands = parser.add_subparsers(dest = 'command')
+    commands.required = True
+
+    p = commands.add_parser('convert', help = 'convert a tree of .dat files to one SEG-Y file per timestamp')
+    p.add_argument('input', help = 'directory containing the .dat files')
+    p.add_argument('output', help = 'directory to save the SEG-Y files')
+    p.add_argument('--header-size', type = int, default = 512, help = 'header size of the .dat files [byte] (default 512)')
+    p.add_argument('--initial', type = int, default = 4, help = 'receiver numbering prefix (default 4)')
+    p.add_argument('--rcv-field', default = 'Inline3D', help = 'trace header field holding the receiver (default Inline3D)')
+    p.add_argument('--dsf', default = 'int32', choices = ['int32', 'int16', 'float32'], help = 'sample format of the .dat files (default int32)')
+    p.add_argument('--dt', type = int, default = 1000, help = 'sampling interval [us] (default 1000)')
+    p.add_argument('--workers', type = int, default = os.cpu_count() or 1, help = 'parallel processes (default: number of CPUs)')
+    p.add_argument('--readers', type = int, default = 2, help = 'reader threads of the single process pipeline (default 2)')
+    p.add_argument('--layout', default = DEFAULT_LAYOUT, help = 'directory layout of the .dat files (default ' + DEFAULT_LAYOUT.replace('%', '%%') + ')')
+    p.add_argument('--segy-format', default = 'float32', choices = ['float32', 'int32', 'int16', 'ibm', 'int8'], help = 'sample format of the SEG-Y files (default float32)')
+    p.add_argument('--little-endian', action = 'store_true', help = 'write little endian SEG-Y rev2 files')
+    p.add_argument('-q', '--quiet', action = 'store_true', help = 'only report the final status')
+    p.set_defaults(func = convert)
+
+    p = commands.add_parser('index', help = 'update the header index of a SEG-Y directory and query it')
+    p.add_argument('archive', help = 'directory containing the SEG-Y files')
+    p.add_argument('--start', help = 'first time of the window, e.g. 2019-11-11T02:00')
+    p.add_argument('--end', help = 'end time of the window (excluded)')
+    p.add_argument('--rcv', type = int, nargs = '+', help = 'receivers to select')
+    p.add_argument('--code', type = int, nargs = '+', help = 'trace identification codes to select')
+    p.add_argument('-q', '--quiet', action = 'store_true', help = 'only print the selected traces')
+    p.set_defaults(func = index)
+
+    p = commands.add_parser('extract', help = 'cut a time window out of consecutive SEG-Y files into one gather')
+    p.add_argument('archive', help = 'directory containing the SEG-Y files')
+    p.add_argument('output', help = 'SEG-Y file to write')
+    p.add_argument('--start', required = True, help = 'first time of the window, e.g. 2019-11-11T02:00:30.5, the milliseconds going to DelayRecordingTime')
+    p.add_argument('--end', required = True, help = 'end time of the window (excluded)')
+    p.add_argument('--rcv', type = int, nargs = '+', help = 'receivers to extract (default all)')
+    p.add_argument('--code', type = int, nargs = '+', help = 'trace identification codes to extract (default all)')
+    p.add_argument('--fill', type = float, default = 0, help = 'value of the samples not covered by any file (default 0)')
+    p.add_argument('-q', '--quiet', action = 'store_true', help = 'do not report the gather size')
+    p.set_defaults(func = extract)
+
+    p = commands.add_parser('detect', help = 'run a streaming STA/LTA detector over the files of a SEG-Y directory')
+    p.add_argument('archive', help = 'directory containing the SEG-Y files')
+    p.add_argument('--nsta', type = int, required = True, help = 'STA window [samples]')
+    p.add_argument('--nlta', type = int, required = True, help = 'LTA window [samples]')
+    p.add_argument('--on', type = float, required = True, help = 'STA/LTA ratio turning a trigger on')
+    p.add_argument('--off', type = float, required = True, help = 'STA/LTA ratio turning a trigger off')
+    p.add_argument('--coincidence', type = int, default = 1, help = 'receivers triggering together to declare an event (default 1)')
+    p.add_argument('--method', default = 'recursive_sta_lta', choices = ['recursive_sta_lta', 'classic_sta_lta', 'delayed_sta_lta'], help = 'characteristic function (default recursive_sta_lta)')
+    p.add_argument('--start', help = 'first time to scan, e.g. 2019-11-11T00:00')
+    p.add_argument('--end', help = 'end time to scan (excluded)')
+    p.add_argument('--rcv', type = int, nargs = '+', help = 'receivers to scan (default all)')
+    p.add_argument('--code', type = int, nargs = '+', help = 'trace identification codes to scan (default all)')
+    p.add_argument('--chunk', type = int, default = 10000, help = 'samples read at once per trace (default 10000)')
+    p.add_argument('--triggers', action = 'store_true', help = 'also print the triggers of every trace')
+    p.add_argument('-q', '--quiet', action = 'store_true', help = 'only print the events')
+    p.set_defaults(func = detect)
+
+    p = commands.add_parser('pick', help = 'pick P and S phases in every SEG-Y file of a directory')
+    p.add_argument('archive', help = 'directory containing the SEG-Y files')
+    p.add_argument('--nsta', type = int, required = True, help = 'STA window [samples]')
+    p.add_argument('--nlta', type = int, required = True, help = 'LTA window [samples]')
+    p.add_argument('--p-thres', type = float, required = True, help = 'STA/LTA ratio of a P pick')
+    p.add_argument('--s-thres', type = float, required = True, help = 'STA/LTA ratio of a S pick')
+    p.add_argument('--method', default = 'recursive_sta_lta', choices = ['recursive_sta_lta', 'classic_sta_lta', 'delayed_sta_lta'], help = 'characteristic function (default recursive_sta_lta)')
+    p.add_argument('--workers', type = int, default = os.cpu_count() or 1, help = 'parallel processes (default: number of CPUs)')
+    p.add_argument('--threads', type = int, help = 'onset search threads per process (default: the CPUs shared among the processes)')
+    p.add_argument('--output', help = '.npz file to save the file list and the picks array to, instead of printing them')
+    p.add_argument('-q', '--quiet', action = 'store_true', help = 'do not report the number of picks')
+    p.set_defaults(func = pick)
+
+    return parser
+
+
+def main(argv = None):
+
+    opts = build_parser().parse_args(argv)
+
+    return opts.func(opts)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,6 +10,7 @@ from PyQt5.QtWidgets import  QApplication, QAbstractSpinBox, QComboBox, QDesktop
 
 from package.thread.segyconverter import SegyConverterThread
 from package.utils.utils import transform_separator
+from package.utils.layout import DEFAULT_LAYOUT
 from package.pyqtconfig import ConfigManager
 
 import datetime
@@ -44,7 +45,11 @@ class MainWindow(QMainWindow):
             'initial':4,
             'rcv_field': 'Inline3D',
             'dsf': 'int32',
-            'dt': 1000}
+            'dt': 1000,
+            'workers': 1,
+            'layout': DEFAULT_LAYOUT,
+            'segy_format': 'float32',
+            'segy_endian': 'big'}
 
         self.config.set_defaults(args)
         
@@ -112,6 +117,30 @@ class MainWindow(QMainWindow):
         self.numSpinBox.setSingleStep(1)
         self.numSpinBox.setValue(4) 
 
+        self.workersLabel = QLabel('Parallel Processes')
+        self.workersSpinBox = QSpinBox()
+        self.workersSpinBox.setAccelerated(True)
+        self.workersSpinBox.setCorrectionMode(QAbstractSpinBox.CorrectToNearestValue)
+        self.workersSpinBox.setMinimum(1)
+        self.workersSpinBox.setMaximum(os.cpu_count() or 1)
+        self.workersSpinBox.setSingleStep(1)
+        self.workersSpinBox.setValue(1) 
+
+        self.layoutLabel = QLabel('Directory Layout')
+        self.layoutLineEdit = QLineEdit(parent=self)
+        self.layoutLineEdit.setText(DEFAULT_LAYOUT)
+        self.layoutLineEdit.setToolTip('Path of the .dat files below the input directory, e.g.\n'
+                                       '{rcv}/{ymd}/{hh}/{mm}T.dat or {ts:%Y%m%d%H%M}/{rcv}.dat')
+
+        self.segyFormatLabel = QLabel('SEG-Y Sample Format')
+        self.segyFormatComboBox = QComboBox()
+        self.segyFormatComboBox.addItems(['float32', 'int32', 'int16', 'ibm', 'int8'])
+
+        self.segyEndianLabel = QLabel('SEG-Y Byte Order')
+        self.segyEndianComboBox = QComboBox()
+        self.segyEndianComboBox.addItems(['big', 'little'])
+        self.segyEndianComboBox.setToolTip('little: SEG-Y rev2 with byte order marker')
+
     
         
 
@@ -163,6 +192,14 @@ class MainWindow(QMainWindow):
         grid2.addWidget(self.rcvComboBox , 3, 1, 1, 2)
         grid2.addWidget(self.numLabel,  4, 0, 1, 1, Qt.AlignRight)
         grid2.addWidget(self.numSpinBox, 4, 1, 1, 2)
+        grid2.addWidget(self.workersLabel,  5, 0, 1, 1, Qt.AlignRight)
+        grid2.addWidget(self.workersSpinBox, 5, 1, 1, 2)
+        grid2.addWidget(self.layoutLabel,  6, 0, 1, 1, Qt.AlignRight)
+        grid2.addWidget(self.layoutLineEdit, 6, 1, 1, 2)
+        grid2.addWidget(self.segyFormatLabel,  7, 0, 1, 1, Qt.AlignRight)
+        grid2.addWidget(self.segyFormatComboBox, 7, 1, 1, 2)
+        grid2.addWidget(self.segyEndianLabel,  8, 0, 1, 1, Qt.AlignRight)
+        grid2.addWidget(self.segyEndianComboBox, 8, 1, 1, 2)
 
         
 
@@ -219,6 +256,10 @@ class MainWindow(QMainWindow):
         self.config.add_handler('rcv_field', self.rcvComboBox)
         self.config.add_handler('dsf', self.dsfComboBox)
         self.config.add_handler('dt', self.dtSpinBox)
+        self.config.add_handler('workers', self.workersSpinBox)
+        self.config.add_handler('layout', self.layoutLineEdit)
+        self.config.add_handler('segy_format', self.segyFormatComboBox)
+        self.config.add_handler('segy_endian', self.segyEndianComboBox)
         
     def createActions(self):
         pass
@@ -275,6 +316,9 @@ class MainWindow(QMainWindow):
     
             self.thread.stop()
 
+            # the jobs already running finish, never destroy a running QThread
+            self.thread.wait()
+
         event.accept()
         
     def setProgressLabel(self, text):
@@ -295,7 +339,6 @@ class MainWindow(QMainWindow):
     def finishProgress(self, completion, str):   
         #self.completion = self.getCompletionStatus(completion)
         self.setProgressLabel(str)
-        self.buttonBox.button(QDialogButtonBox.Ok).setEnabled(True)
 
 
     def cancelConversion(self):
@@ -316,8 +359,13 @@ class MainWindow(QMainWindow):
             
     def setAbortStatus(self):
 
+        # Convert stays disabled until the thread has finished the running jobs,
+        # so that two converters never share the output directory
+        self.setProgressLabel ("Stopping the conversion, waiting for the files being written...")
+
+    def threadFinished(self):
+
         self.buttonBox.button(QDialogButtonBox.Ok).setEnabled(True)
-        self.setProgressLabel ("Conversion stopped. Click 'Convert' to restart the conversion process.")
 
     
     def killThread(self):
@@ -347,6 +395,7 @@ class MainWindow(QMainWindow):
             self.thread.progressSignal_.connect(self.updateProgress)
             self.thread.finishSignal_.connect(self.finishProgress)
             self.thread.sendError_.connect(self.showError)
+            self.thread.finished.connect(self.threadFinished)
             self.thread.start()
             self.buttonBox.button(QDialogButtonBox.Ok).setEnabled(False)
 
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mappable trace container (.sgc), an alternative to the pickled .mic
+dict files holding the same (data, binary header, trace headers) triplet.
+
+One file, little endian framing:
+
+    magic           8 bytes, CONTAINER_MAGIC
+    header length   uint64
+    header          JSON: binary header values, trace header field order and
+                    the dtype, shape and offset of every block
+    blocks          raw arrays, each aligned on CONTAINER_ALIGN bytes
+
+The blocks are the trace samples, stored trace after trace as (ntraces, ns),
+the trace headers as one structured table, any array of the binary header
+(e.g. SH["time"]) and the 3200 bytes textual header of a SEG-Y source.
+Opening a container maps every block with np.memmap, so reading a few traces
+or a time window only reads those pages:
+
+    Data, SH, STH = readContainer('20191111_020000.sgc')
+    window = Data[30000:40000, 12:15]
+
+Sample and header dtypes, byte order included, and the types of the binary
+header values are kept, so .mic -> .sgc -> .mic and SEG-Y -> .sgc -> SEG-Y
+give back what went in (see convertTraceFile).
+"""
+
+import os
+import json
+import struct
+
+import numpy as np
+
+from . import pssegy
+from ..utils.utils import load_dict, save_dict, transform_separator
+
+
+CONTAINER_MAGIC = b'PSSGC\x00\x01\x00'
+
+CONTAINER_ALIGN = 4096
+
+CONTAINER_SUFFIX = '.sgc'
+
+
+def _align(n):
+
+    return -(-n // CONTAINER_ALIGN) * CONTAINER_ALIGN
+
+
+def _dtypeToJson(dtype):
+
+    if dtype.names is None:
+        return dtype.str
+
+    # names, formats and offsets also describe the overlapping fields of STH_def
+    return {'names': list(dtype.names),
+            'formats': [_dtypeToJson(dtype.fields[name][0]) for name in dtype.names],
+            'offsets': [dtype.fields[name][1] for name in dtype.names],
+            'itemsize': dtype.itemsize}
+
+
+def _dtypeFromJson(obj):
+
+    if isinstance(obj, str):
+        return np.dtype(obj)
+
+    return np.dtype({'names': obj['names'],
+                     'formats': [_dtypeFromJson(f) for f in obj['formats']],
+                     'offsets': obj['offsets'],
+                     'itemsize': obj['itemsize']})
+
+
+class _Blocks:
+
+    """
+    Arrays to write after the JSON header, with their offsets from the first block.
+    """
+
+    def __init__(self):
+
+        self.arrays = []
+        self.meta = {}
+        self.size = 0
+
+    def add(self, name, array, transposed=False):
+
+        array = np.asarray(array)
+        stored = array.T if transposed else array
+
+        self.meta[name] = {'dtype': _dtypeToJson(array.dtype), 'shape': list(stored.shape),
+                           'offset': self.size, 'transposed': transposed}
+        self.arrays.append((self.size, stored))
+        self.size = _align(self.size + stored.nbytes)
+
+        return {'__block__': name}
+
+
+def _encodeValue(key, value, blocks):
+
+    if isinstance(value, np.ndarray):
+        return blocks.add('vh:' + key, value)
+
+    if isinstance(value, np.generic):
+        return {'__numpy__': value.dtype.str, 'value': value.item()}
+
+    if isinstance(value, bytes):
+        return {'__bytes__': value.hex()}
+
+    return value
+
+
+def _decodeValue(value, arrays):
+
+    if isinstance(value, dict):
+        if '__block__' in value:
+            return arrays[value['__block__']]
+        if '__numpy__' in value:
+            return np.dtype(value['__numpy__']).type(value['value'])
+        if '__bytes__' in value:
+            return bytes.fromhex(value['__bytes__'])
+
+    return value
+
+
+def _writeArray(f, array, chunk_bytes=2**26):
+
+    if array.ndim < 2 or array.nbytes <= chunk_bytes:
+        f.write(np.ascontiguousarray(array).tobytes())
+        return
+
+    step = max(1, int(chunk_bytes // (array[0].nbytes or 1)))
+    for i0 in range(0, len(array), step):
+        f.write(np.ascontiguousarray(array[i0:i0 + step]).tobytes())
+
+
+def writeContainer(filename, Data, SH, STH, text=None):
+    """
+    writeContainer(filename, Data, SH, STH, text)
+    Write the (ns, ntraces) Data, the binary header dict SH and the trace
+    headers STH (dict of arrays or SegyTraceHeaders) to a .sgc container,
+    with the optional 3200 bytes SEG-Y textual header text.
+    The file is written aside and renamed when complete.
+    """
+    filename = transform_separator(filename)
+
+    Data = np.asarray(Data)
+    ntraces = Data.shape[1] if Data.ndim == 2 else len(Data)
+
+    blocks = _Blocks()
+
+    # one trace after the other: a trace is contiguous, a time window is one
+    # contiguous run per trace
+    blocks.add('data', Data, transposed=Data.ndim == 2)
+
+    header = {'vh': {key: _encodeValue(key, value, blocks) for key, value in SH.items()}}
+
+    if isinstance(STH, pssegy.SegyTraceHeaders):
+        header['th'] = {'class': 'SegyTraceHeaders'}
+        blocks.add('th', STH.data)
+
+    else:
+        keys = list(STH.keys())
+        columns = [key for key in keys if np.ndim(STH[key]) == 1 and len(STH[key]) == ntraces]
+        table = np.zeros(ntraces, dtype=[(key, np.asarray(STH[key]).dtype) for key in columns])
+        for key in columns:
+            table[key] = STH[key]
+
+        header['th'] = {'class': 'dict', 'keys': keys,
+                        'other': {key: _encodeValue(key, STH[key], blocks) for key in keys if key not in columns}}
+        blocks.add('th', table)
+
+    if text is not None:
+        blocks.add('text', np.frombuffer(bytes(text), dtype=np.uint8))
+
+    header['blocks'] = blocks.meta
+
+    head = json.dumps(header).encode('utf-8')
+    base = _align(len(CONTAINER_MAGIC) + 8 + len(head))
+
+    tmp = filename + '.part'
+    with open(tmp, 'wb') as f:
+        f.write(CONTAINER_MAGIC)
+        f.write(struct.pack('<Q', len(head)))
+        f.write(head)
+        for offset, array in blocks.arrays:
+            f.seek(base + offset)
+            _writeArray(f, array)
+        f.truncate(base + blocks.size)
+
+    os.replace(tmp, filename)
+
+
+class TraceContainer:
+
+    """
+    A .sgc container opened with np.memmap: Data, SH, STH and text (the SEG-Y
+    textual header or None). mode is that of np.memmap, 'c' (copy-on-write,
+    default), 'r' or 'r+'.
+    """
+
+    def __init__(self, filename, mode='c'):
+
+        self.filename = transform_separator(filename)
+
+        with open(self.filename, 'rb') as f:
+            if f.read(len(CONTAINER_MAGIC)) != CONTAINER_MAGIC:
+                raise ValueError(self.filename + " is not a trace container")
+            (length,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(length).decode('utf-8'))
+
+        base = _align(len(CONTAINER_MAGIC) + 8 + length)
+
+        arrays = {}
+        for name, meta in header['blocks'].items():
+            dtype = _dtypeFromJson(meta['dtype'])
+            shape = tuple(meta['shape'])
+            if int(np.prod(shape)) == 0:
+                array = np.zeros(shape, dtype=dtype)
+            else:
+                array = np.memmap(self.filename, dtype=dtype, mode=mode, offset=base + meta['offset'], shape=shape)
+            arrays[name] = array.T if meta['transposed'] else array
+
+        self.Data = arrays['data']
+        self.SH = {key: _decodeValue(value, arrays) for key, value in header['vh'].items()}
+
+        if header['th']['class'] == 'SegyTraceHeaders':
+            self.STH = pssegy.SegyTraceHeaders(data=arrays['th'])
+        else:
+            other = header['th']['other']
+            self.STH = {key: _decodeValue(other[key], arrays) if key in other else arrays['th'][key]
+                        for key in header['th']['keys']}
+
+        self.text = bytes(arrays['text']) if 'text' in arrays else None
+
+
+def readContainer(filename, mode='c'):
+    """
+    Data,SH,STH=readContainer(filename,mode)
+    Memory-mapped contents of a .sgc container, see TraceContainer.
+    """
+    container = TraceContainer(filename, mode)
+
+    return container.Data, container.SH, container.STH
+
+
+def segyToContainer(segyfile, filename):
+    """
+    Copy a SEG-Y file to a .sgc container: samples in the file sample type
+    (IBM floats decoded), the 240 bytes trace headers as they are and the
+    textual header.
+    """
+    SH = pssegy.getSegyHeader(transform_separator(segyfile))
+    SH['ntraces'] = int(SH['ntraces'])
+
+    traces = pssegy.mapSegyTraces(SH, mode='r')
+
+    if SH['DataSampleFormat'] == 1:
+        Data = pssegy.ibm2ieee(traces['data']).T
+    else:
+        Data = traces['data'].T
+
+    STH = pssegy.SegyTraceHeaders(data=traces['header'])
+
+    with open(SH['filename'], 'rb') as f:
+        text = f.read(pssegy.SEGY_ASCII_REEL_HEADER_BYTES)
+
+    writeContainer(filename, Data, SH, STH, text)
+
+
+def containerToSegy(filename, segyfile):
+    """
+    Write a .sgc container as a SEG-Y file, in the sample format and byte
+    order of its binary header (big endian IEEE floats if it has none).
+    """
+    container = TraceContainer(filename, mode='r')
+
+    Data = container.Data
+    SH = dict(container.SH)
+    SH.setdefault('DataSampleFormat', 5)
+    SH['ns'] = Data.shape[0]
+    SH['ntraces'] = Data.shape[1]
+    endian = SH.get('endian', '>')
+
+    segyfile = transform_separator(segyfile)
+    tmp = segyfile + '.part'
+
+    with open(tmp, 'wb') as f:
+        f.write(container.text or bytes(pssegy.SEGY_ASCII_REEL_HEADER_BYTES))
+        f.write(pssegy.packSegyHeader(SH, endian)[pssegy.SEGY_ASCII_REEL_HEADER_BYTES:])
+        pssegy.writeSegyTraces(f, Data, container.STH, SH['ns'], SH['ntraces'], pssegy.getSampleDtype(SH),
+                               endian, ibm=SH['DataSampleFormat'] == 1)
+
+    os.replace(tmp, segyfile)
+
+
+def micToContainer(micfile, filename):
+    """
+    Copy a pickled .mic dict file to a .sgc container.
+    """
+    dic = load_dict(transform_separator(micfile))
+
+    writeContainer(filename, dic['data'], dic['vh'], dic['th'])
+
+
+def containerToMic(filename, micfile):
+    """
+    Write a .sgc container as a pickled .mic dict file, arrays read in memory.
+    """
+    Data, SH, STH = readContainer(filename, mode='r')
+
+    def load(value):
+        return np.array(value) if isinstance(value, np.ndarray) else value
+
+    if isinstance(STH, pssegy.SegyTraceHeaders):
+        STH = STH.copy()
+    else:
+        STH = {key: load(value) for key, value in STH.items()}
+
+    save_dict({'data': np.array(Data),
+               'vh': {key: load(value) for key, value in SH.items()},
+               'th': STH}, transform_separator(micfile))
+
+
+def convertTraceFile(src, dst):
+    """
+    Convert between .mic, .sgc and SEG-Y (.sgy, .segy) files, by suffix.
+    """
+    kinds = {'.mic': 'mic', CONTAINER_SUFFIX: 'sgc', '.sgy': 'segy', '.segy': 'segy'}
+
+    a = kinds.get(os.path.splitext(src)[1].lower())
+    b = kinds.get(os.path.splitext(dst)[1].lower())
+
+    if a is None or b is None or a == b:
+        raise ValueError("Cannot convert " + src + " to " + dst)
+
+    if a == 'sgc':
+        return containerToMic(src, dst) if b == 'mic' else containerToSegy(src, dst)
+
+    if b == 'sgc':
+        return micToContainer(src, dst) if a == 'mic' else segyToContainer(src, dst)
+
+    # .mic <-> SEG-Y through a container next to the destination
+    tmp = dst + CONTAINER_SUFFIX
+    try:
+        convertTraceFile(src, tmp)
+        convertTraceFile(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
@@ -0,0 +1,649 @@
+# -*- coding: utf-8 -*-
+"""
+Conversion of recorder .dat files to SEG-Y, one file per timestamp.
+
+This module has no Qt dependency: it is driven by the GUI through
+package.thread.segyconverter.SegyConverterThread and headless through
+package.cli.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from . import pssegy 
+from ..utils.utils import transform_separator
+from ..utils.layout import DirectoryLayout, DEFAULT_LAYOUT
+from ..utils.manifest import ConversionManifest
+
+
+import numpy as np
+import datetime
+
+
+NUMPY_DTYPES = {'ibm':     np.dtype('<f4'),
+
+                'int32':   np.dtype('<i4'),
+
+                'int16':   np.dtype('<i2'),
+
+                'uint16':   np.dtype('<u2'),
+
+                'float32': np.dtype('<f4'),
+
+                'int8':    np.dtype('<i1')}
+
+
+def parseDataBuffer(fs, dsf = 'int32', endian = '>', skip = 512, com = 3):
+    """
+    Return the (ns, com) component matrix of an open .dat file, columns in
+    recording order (y, x, z for 3C).
+
+    The samples past the header are memory-mapped and reshaped in place, so
+    no copy of the file is made. A buffered read of the whole multiplexed
+    frames is only done when the file size is not a multiple of com*bps.
+    """
+
+    cformat = NUMPY_DTYPES[dsf]
+    bps = cformat.itemsize
+
+    headsize = skip
+
+    filesize = os.fstat(fs.fileno()).st_size
+
+    tracesize = max(filesize - headsize, 0)
+
+    ns = tracesize // (com * bps)
+
+    if ns == 0:
+
+        return np.zeros((0, com), dtype = cformat)
+
+    if tracesize % (com * bps) == 0:
+
+        traces = np.memmap(fs, dtype = cformat, mode = 'r', offset = headsize, shape = (ns, com))
+
+    else:
+
+        # truncated file: keep complete frames only
+        fs.seek(headsize)
+        trc = fs.read(ns * com * bps)
+        traces = np.frombuffer(trc, cformat).reshape(ns, com)
+
+    return traces
+
+
+def createRcvList(rcvs, initial = 4):
+
+    rcvNames_float = []
+    for r in rcvs:
+
+        rfloat = float(str(initial) + r)
+
+        rcvNames_float.append(rfloat)
+
+    return rcvNames_float
+
+
+def indexDatFiles(root, layout = DEFAULT_LAYOUT):
+    """
+    Walk root once and return {timestamp: [(rcv, path, size, mtime_ns), ...]} for the
+    .dat files matching the directory layout pattern, timestamps as
+    'YYYYMMDD_HHMMSS'. See package.utils.layout for the pattern syntax.
+    """
+
+    return DirectoryLayout(layout).index(root)
+
+
+def segyOutputFormat(args):
+    """
+    Return (dsf, endian, sample dtype) of the SEG-Y files written for args:
+    args['segy_format'] is a key of pssegy.DSF_CODES (default 'float32') and
+    args['segy_endian'] 'big' (default, rev1) or 'little' (rev2).
+    """
+
+    fmt = args.get('segy_format', 'float32')
+    endian = '<' if args.get('segy_endian', 'big') == 'little' else '>'
+
+    if fmt == 'ibm':
+        # encoded from float32 when written
+        dtype = np.dtype(np.float32)
+    else:
+        dtype = pssegy.NUMPY_DTYPES[fmt].newbyteorder(endian)
+
+    return pssegy.DSF_CODES[fmt], endian, dtype
+
+
+def expectedSegyShape(sizelist, args):
+    """
+    Return (ns, ntr) of the SEG-Y file convert2segy writes for .dat files of the given sizes.
+    """
+
+    bps = NUMPY_DTYPES[args['dsf']].itemsize
+
+    nslist = [max(size - args['header_size'], 0) // (3 * bps) for size in sizelist]
+
+    return nslist[0], 3 * nslist.count(nslist[0])
+
+
+def expectedSegySize(sizelist, args):
+    """
+    Size in bytes of the SEG-Y file convert2segy writes for .dat files of the given sizes.
+    """
+
+    ns, ntr = expectedSegyShape(sizelist, args)
+
+    dsf, endian, dtype = segyOutputFormat(args)
+
+    return 3600 + ntr * (240 + ns * dtype.itemsize)
+
+
+def readDatFiles(filelist, args, sizelist = None):
+    """
+    Open the .dat files of one timestamp and return (inds, frames): the indices
+    in filelist of the receivers kept and their (ns, 3) component matrices,
+    memory-mapped by parseDataBuffer so that the samples are only copied once,
+    into the SEG-Y output. The kernel is asked to read them ahead where
+    posix_fadvise exists. Files shorter than their indexed size are dropped,
+    so inds is empty when all of them changed since indexing.
+    """
+
+    dsf = args['dsf']
+    skip = args['header_size']
+    cformat = NUMPY_DTYPES[dsf]
+    bps = cformat.itemsize
+
+    # size pre-pass: sample number of every receiver from its file size only,
+    # receivers that differ from the first one are dropped
+
+    if sizelist is None:
+        sizelist = [os.path.getsize(filename) for filename in filelist]
+
+    nslist = [max(size - skip, 0) // (3 * bps) for size in sizelist]
+
+    inds = [i for i, n in enumerate(nslist) if n == nslist[0]]
+
+    frames = []
+    kept = []
+
+    ns = nslist[0]
+
+    for i in inds:
+
+        with open(filelist[i], 'rb') as f:
+
+            frame = parseDataBuffer(f, dsf, skip = skip)
+
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), skip, ns * 3 * bps, os.POSIX_FADV_WILLNEED)
+
+        # a file shorter than when it was indexed (e.g. still being copied)
+        # is dropped like any other size mismatch
+        if len(frame) < ns:
+            continue
+
+        kept.append(i)
+        frames.append(frame[:ns])
+
+    return kept, frames
+
+
+def assembleSegy(outfile, frames, rcvlist, inds, args):
+    """
+    Return the Segy of one timestamp from the frames of readDatFiles, samples
+    in the SEG-Y sample type and byte order, headers dated from outfile.
+    """
+
+    # allocate the output once in the SEG-Y sample type and byte order and fill
+    # receiver columns in place, int32 counts written as int32 are only copied
+
+    segy_dsf, segy_endian, segy_dtype = segyOutputFormat(args)
+
+    ns = len(frames[0]) if frames else 0
+
+    data = np.empty((ns, 3 * len(inds)), dtype = segy_dtype)
+
+    for j, frame in enumerate(frames):
+
+        # counts out of a narrower format range would wrap silently
+        pssegy.checkSampleRange(frame, segy_dtype)
+
+        data[:, 3 * j:3 * j + 3] = frame
+
+
+
+    ## prepare SEGY header
+    dt = args['dt']
+    ns, ntr = data.shape
+    rcvs = np.array(rcvlist)[inds]
+    
+
+    SH = pssegy.getDefaultSegyHeader(ntr, ns, dt)
+    STH = pssegy.getDefaultSegyTraceHeaders(ntr, ns, dt) 
+
+    STH['TraceIdentificationCode'][0:ntr:3] = 14
+    STH['TraceIdentificationCode'][1:ntr:3] = 13
+    STH['TraceIdentificationCode'][2:ntr:3] = 12
+
+    field = args['rcv_field']
+    STH[field] = np.repeat(rcvs,3)
+
+    # STH[field][0:int(ntr/3)] = rcvs
+    # STH[field][int(ntr/3): 2*int(ntr/3)] = rcvs
+    # STH[field][2*int(ntr/3): 3*int(ntr/3)] = rcvs
+
+
+    # deal with date time
+
+    basename = os.path.basename(outfile)
+    fname  = os.path.splitext(basename)[0]
+
+    ymd_hms = fname.split('_')
+    ymd = ymd_hms[0]
+    hms = ymd_hms[1]
+
+
+
+
+    yy = int(float(ymd[:4]))
+    mm = int(float(ymd[4:6]))
+    dd = int(float(ymd[6:]))
+
+    hour = int(float(hms[:2]))
+    minute = int(float(hms[2:4]))
+    second = int(float(hms[4:6] or 0))
+
+    record_day = datetime.datetime(yy,mm,dd)
+    day_of_year = (record_day - datetime.datetime(record_day.year, 1, 1)).days + 1
+    #print(day_of_year)
+    
+
+    STH['YearDataRecorded'] = yy
+    STH['DayOfYear'] = day_of_year
+    STH['HourOfDay'] = hour
+    STH['MinuteOfHour'] = minute
+    STH['SecondOfMinute'] = second
+
+    return pssegy.Segy(data, SH, STH)
+
+
+def writeSegyFile(outfile, segy, args):
+    """
+    Write the Segy of assembleSegy to outfile in the SEG-Y format of args and
+    return its trace number. The file is written under a temporary name and
+    renamed when complete, so outfile never exists half written.
+    """
+
+    segy_dsf, segy_endian, segy_dtype = segyOutputFormat(args)
+
+    tmpfile = outfile + '.part'
+    segy.toSegyFile(tmpfile, segy_endian, segy_dsf)
+    os.replace(tmpfile, outfile)
+
+    #print(outfile, ' written[OK].')
+
+    return segy.traceData.shape[1]
+
+
+def convert2segy(outfile, filelist, rcvlist, args, sizelist = None):
+    """
+    Merge the .dat files of one timestamp into outfile and return its trace number,
+    or None when none of the files is complete any more (see readDatFiles) and
+    nothing is written. The file is written under a temporary name and renamed
+    when complete, so outfile never exists half written.
+    """
+
+    inds, frames = readDatFiles(filelist, args, sizelist)
+
+    if not inds:
+        return None
+
+    segy = assembleSegy(outfile, frames, rcvlist, inds, args)
+
+    return writeSegyFile(outfile, segy, args)
+
+
+def _put(q, item, cancel):
+    """
+    Blocking put on the bounded queue q, given up when cancel is set.
+    """
+
+    while not cancel.is_set():
+        try:
+            q.put(item, timeout = 0.1)
+            return True
+        except queue.Full:
+            pass
+
+    return False
+
+
+def _get(q, cancel):
+    """
+    Blocking get from q, None when cancel is set.
+    """
+
+    while not cancel.is_set():
+        try:
+            return q.get(timeout = 0.1)
+        except queue.Empty:
+            pass
+
+    return None
+
+
+
+class SegyConverter:
+    """
+    Convert the .dat files below inpath to one SEG-Y file per timestamp in outpath.
+
+    args holds the conversion parameters: header_size, initial, rcv_field, dsf,
+    dt and optionally workers (processes, default 1) and layout (directory
+    layout pattern, default DEFAULT_LAYOUT). With one process the conversion
+    is pipelined (see convertPipeline) with readers reader threads (default 2)
+    and queue_size timestamps queued between stages (default 2).
+    Progress is reported through the label(str) and progress(i, imax) callbacks.
+    A timestamp whose .dat files all changed since indexing (e.g. still being
+    copied) is skipped and left started in the manifest, so the next run
+    converts it.
+    """
+
+    def __init__(self, inpath, outpath, args, label = None, progress = None):
+
+        self.running = True
+
+        self.inpath = inpath
+
+        self.outpath = outpath
+
+        self.args = args
+
+        self.label = label if label is not None else (lambda text: None)
+
+        self.progress = progress if progress is not None else (lambda i, imax: None)
+
+        self.manifest = None
+        self.fmt = None
+
+    def stop(self):
+        """
+        Request cancellation; conversions already running are allowed to finish.
+        """
+    
+        self.running = False
+
+    def run(self):
+        """
+        Convert every timestamp not yet complete in the output directory.
+        Return True when all jobs are done, False when stopped.
+        """
+
+        root = self.inpath
+
+        outpath = self.outpath
+
+        args = self.args
+
+
+        # index all .dat files in one pass, key = timestamp, value = [(rcv, path, size, mtime)]
+
+        self.label("Indexing .dat files in " + root)
+
+        index = indexDatFiles(root, args.get('layout', DEFAULT_LAYOUT))
+
+
+        # create reciver list in float
+
+        initial = args['initial']
+
+
+        # merge .dat files with same timestamp, skipping outputs the manifest
+        # reports complete for unchanged inputs
+
+        os.makedirs(outpath, exist_ok = True)
+
+        outputs = {}
+        for entry in os.scandir(outpath):
+            if entry.is_file():
+                outputs[entry.name] = entry.stat().st_size
+
+        self.manifest = ConversionManifest(outpath)
+
+        # outputs in the original float32 big endian format carry no format tag
+        segy_dsf, segy_endian, segy_dtype = segyOutputFormat(args)
+        self.fmt = None if (segy_dsf, segy_endian) == (5, '>') else [segy_dsf, segy_endian]
+
+        jobs = []
+
+        for timestamp in sorted(index):
+
+            name = timestamp + '.sgy'
+
+            outfile = transform_separator(os.path.join(outpath, name))
+
+            entries = index[timestamp]
+
+            filelist = [path for rcv, path, size, mtime in entries]
+            rcvlist = createRcvList([rcv for rcv, path, size, mtime in entries], initial = initial)
+            sizelist = [size for rcv, path, size, mtime in entries]
+            inputs = [[path, size, mtime] for rcv, path, size, mtime in entries]
+
+            if self.fmt is None and name not in self.manifest and outputs.get(name) == expectedSegySize(sizelist, args):
+
+                # complete output of a run without manifest
+                ns, ntr = expectedSegyShape(sizelist, args)
+                self.manifest.finish(name, inputs, ntr, outputs[name])
+
+            if not self.manifest.isComplete(name, inputs, outputs.get(name), self.fmt):
+
+                jobs.append((outfile, filelist, rcvlist, sizelist, inputs))
+            
+            else:
+                self.label('Skip writing SEG-Y file: ' + outfile)    
+                #print('Skip writing SEG-Y file: ' + outfile)
+
+        workers = int(args.get('workers', 1))
+
+        try:
+            if workers > 1:
+                completed = self.convertParallel(jobs, args, workers)
+            else:
+                completed = self.convertPipeline(jobs, args)
+        finally:
+            self.manifest.close()
+
+        return completed
+
+    def finishJob(self, outfile, inputs, ntr):
+        """
+        Record the output of a job in the manifest, ntr being its trace number
+        or None when the job was skipped.
+        """
+
+        if ntr is None:
+            self.label('Skip SEG-Y file, .dat files changed since indexing: ' + outfile)
+            return
+
+        self.manifest.finish(os.path.basename(outfile), inputs, ntr, os.path.getsize(outfile), self.fmt)
+        self.label('SEG-Y file written: ' + outfile)
+
+    def convertPipeline(self, jobs, args):
+        """
+        Convert the jobs in this process as three stages connected by bounded
+        queues: reader threads load the .dat files of the next timestamps while
+        the assembler thread builds the SEG-Y samples and headers of the current
+        one and the writer thread writes the previous one to disk. A full queue
+        blocks the stage feeding it. Timestamps waiting for the assembler only
+        hold memory maps of their files, so at most queue_size + 2 assembled
+        timestamps are held in memory. A failing stage cancels the others and
+        its exception is raised here.
+        """
+
+        maxVal = len(jobs)
+        self.progress(0, maxVal)
+
+        readers = max(1, int(args.get('readers', 2)))
+        depth = max(1, int(args.get('queue_size', 2)))
+
+        todo = queue.Queue()
+        for job in jobs:
+            todo.put(job)
+
+        loaded = queue.Queue(maxsize = depth)
+        assembled = queue.Queue(maxsize = depth)
+        done = queue.Queue()
+        cancel = threading.Event()
+
+        def read():
+            try:
+                while not cancel.is_set():
+                    try:
+                        job = todo.get_nowait()
+                    except queue.Empty:
+                        break
+                    outfile, filelist, rcvlist, sizelist, inputs = job
+                    inds, frames = readDatFiles(filelist, args, sizelist)
+                    if not inds:
+                        done.put((job, None))
+                        continue
+                    if not _put(loaded, (job, (inds, frames)), cancel):
+                        break
+            except Exception as reason:
+                done.put(reason)
+            finally:
+                # one end marker per reader
+                _put(loaded, None, cancel)
+
+        def assemble():
+            try:
+                ended = 0
+                while ended < readers:
+                    item = _get(loaded, cancel)
+                    if cancel.is_set():
+                        break
+                    if item is None:
+                        ended += 1
+                        continue
+                    (outfile, filelist, rcvlist, sizelist, inputs), (inds, frames) = item
+                    segy = assembleSegy(outfile, frames, rcvlist, inds, args)
+                    if not _put(assembled, (item[0], segy), cancel):
+                        break
+            except Exception as reason:
+                done.put(reason)
+            finally:
+                _put(assembled, None, cancel)
+
+        def write():
+            try:
+                while True:
+                    item = _get(assembled, cancel)
+                    if item is None:
+                        break
+                    job, segy = item
+                    done.put((job, writeSegyFile(job[0], segy, args)))
+            except Exception as reason:
+                done.put(reason)
+
+        for outfile, filelist, rcvlist, sizelist, inputs in jobs:
+            self.manifest.start(os.path.basename(outfile), inputs, self.fmt)
+
+        threads = [threading.Thread(target = read, daemon = True) for i in range(readers)]
+        threads += [threading.Thread(target = assemble, daemon = True), threading.Thread(target = write, daemon = True)]
+
+        for thread in threads:
+            thread.start()
+
+        n = 0
+
+        try:
+
+            while n < maxVal:
+
+                if not self.running:
+                    return False
+
+                try:
+                    item = done.get(timeout = 0.5)
+                except queue.Empty:
+                    continue
+
+                if isinstance(item, Exception):
+                    raise item
+
+                (outfile, filelist, rcvlist, sizelist, inputs), ntr = item
+
+                self.finishJob(outfile, inputs, ntr)
+
+                n += 1
+                self.progress(n, maxVal)
+
+            return True
+
+        finally:
+
+            cancel.set()
+            for thread in threads:
+                thread.join()
+
+            # files the writer completed while stopping are kept
+            while not done.empty():
+                item = done.get()
+                if not isinstance(item, Exception):
+                    (outfile, filelist, rcvlist, sizelist, inputs), ntr = item
+                    self.finishJob(outfile, inputs, ntr)
+
+    def convertParallel(self, jobs, args, workers):
+        """
+        Fan the conversion jobs out to a pool of processes. Progress is reported
+        as jobs complete; the first failing job cancels the pending ones and its
+        exception is raised here.
+        """
+
+        maxVal = len(jobs)
+        self.progress(0, maxVal)
+
+        done = 0
+        completed = True
+
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+
+            pending = {}
+            for outfile, filelist, rcvlist, sizelist, inputs in jobs:
+                self.manifest.start(os.path.basename(outfile), inputs, self.fmt)
+                future = executor.submit(convert2segy, outfile, filelist, rcvlist, args, sizelist)
+                pending[future] = (outfile, inputs)
+
+            try:
+
+                while pending:
+
+                    if not self.running:
+                        completed = False
+                        break
+
+                    finished, _ = wait(pending, timeout = 0.5, return_when = FIRST_COMPLETED)
+
+                    for future in finished:
+
+                        outfile, inputs = pending.pop(future)
+
+                        self.finishJob(outfile, inputs, future.result())
+
+                        done += 1
+                        self.progress(done, maxVal)
+
+            finally:
+
+                for future in pending:
+                    future.cancel()
+
+                # jobs already running finish before the pool shuts down, the
+                # files written meanwhile are kept
+                executor.shutdown(wait = True)
+
+                for future, (outfile, inputs) in pending.items():
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        self.finishJob(outfile, inputs, future.result())
+
+        return completed
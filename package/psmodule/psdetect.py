@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming STA/LTA event detection over a directory of consecutive SEG-Y files.
+
+The files are walked in time order and read through np.memmap in blocks of
+samples; the characteristic function of all the traces of a block is computed
+at once (see pspicker.StreamingStaLta) and its LTA state is carried over from
+one block and one file to the next, so that a minute file boundary is not seen
+by the detector. Triggers still on at the end of a file are closed in the next
+one.
+
+The stream restarts (LTA warm-up included) when a file does not follow the
+previous one in time, or holds another set of receivers and codes.
+
+    triggers, events = detectSegyArchive('/data/segy', nsta=50, nlta=1000,
+                                         thr_on=4, thr_off=1.5, coincidence=5)
+
+Each trigger is a dict of rcv, code, on, off (np.datetime64[us]) and peak
+(the maximum of the characteristic function); each event a dict of time,
+duration [s], rcvs, coincidence and the triggers it groups.
+
+P and S phases are picked file by file over a whole directory with a pool of
+processes, see pickSegyDirectory.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import pssegy
+from .psindex import SegyArchiveIndex, scanSegyFile
+from .pspicker import StreamingStaLta, trigger_onset, PICK_DTYPE
+from ..utils.utils import transform_separator
+
+
+class StaLtaDetector:
+
+    """
+    Trigger detector fed with consecutive SEG-Y files, see detectSegyFiles.
+    """
+
+    def __init__(self, nsta, nlta, thr_on, thr_off, method = 'recursive_sta_lta',
+                 receivers = None, codes = None, chunk = 10000):
+
+        self.thr_on = thr_on
+        self.thr_off = thr_off
+        self.receivers = receivers
+        self.codes = codes
+        self.chunk = chunk
+
+        self.cf = StreamingStaLta(nsta, nlta, method)
+        self.triggers = []
+
+        self.keys = None
+        self.t0 = None
+        self.dt = None
+        self.count = 0
+
+    def _restart(self, keys, t0, dt):
+
+        self.close()
+
+        self.cf.reset()
+        self.keys = keys
+        self.t0 = t0
+        self.dt = dt
+        self.count = 0
+
+        self.on = np.full(len(keys), -1, dtype=np.int64)
+        self.peak = np.zeros(len(keys))
+
+    def _time(self, sample):
+
+        return self.t0 + np.timedelta64(int(sample) * self.dt, 'us')
+
+    def _trigger(self, column, on, off, peak):
+
+        rcv, code = self.keys[column]
+        self.triggers.append({'rcv': rcv, 'code': code, 'on': self._time(on), 'off': self._time(off),
+                              'peak': float(peak)})
+
+    def _block(self, cf):
+
+        n = len(cf)
+        base = self.count
+        start = np.zeros(cf.shape[1], dtype=np.int64)
+
+        # triggers left on by the previous block
+        for column in np.flatnonzero(self.on >= 0):
+            below = np.flatnonzero(cf[:, column] <= self.thr_off)
+            if len(below):
+                k = below[0]
+                self._trigger(column, self.on[column], base + k - 1, max(self.peak[column], cf[:k, column].max(initial=0)))
+                self.on[column] = -1
+                start[column] = k
+            else:
+                self.peak[column] = max(self.peak[column], cf[:, column].max())
+                start[column] = n
+
+        # new triggers, only looked for in the traces going above thr_on
+        for column in np.flatnonzero((cf > self.thr_on).any(axis=0)):
+            s = start[column]
+            if s >= n:
+                continue
+            trace = cf[s:, column]
+            for on, off in trigger_onset(trace, self.thr_on, self.thr_off):
+                if off == len(trace) - 1 and trace[off] > self.thr_off:
+                    self.on[column] = base + s + on
+                    self.peak[column] = trace[on:].max()
+                else:
+                    self._trigger(column, base + s + on, base + s + off, trace[on:off + 1].max())
+
+        self.count += n
+
+    def feed(self, filename):
+        """
+        Run the detector over the next file, return the number of triggers closed.
+        """
+        before = len(self.triggers)
+
+        SH = pssegy.getSegyHeader(filename)
+        ns, dt, columns = scanSegyFile(filename)
+
+        sel = np.ones(len(columns['Inline3D']), dtype=bool)
+        if self.receivers is not None:
+            sel &= np.isin(columns['Inline3D'], self.receivers)
+        if self.codes is not None:
+            sel &= np.isin(columns['TraceIdentificationCode'], self.codes)
+
+        rows = np.flatnonzero(sel)
+        rows = rows[np.lexsort((columns['TraceIdentificationCode'][rows], columns['Inline3D'][rows]))]
+
+        if len(rows) == 0:
+            return 0
+
+        keys = [(int(r), int(c)) for r, c in zip(columns['Inline3D'][rows], columns['TraceIdentificationCode'][rows])]
+        t0 = pssegy.headerTimes(columns['YearDataRecorded'][rows], columns['DayOfYear'][rows], columns['HourOfDay'][rows],
+                                columns['MinuteOfHour'][rows], columns['SecondOfMinute'][rows]).min().astype('datetime64[us]')
+
+        # header times are whole seconds: a file follows the stream if it starts within a second of its end
+        if (keys != self.keys or dt != self.dt or
+                abs((t0 - self._time(self.count)).astype(np.int64)) >= 1000000):
+            self._restart(keys, t0, dt)
+
+        traces = pssegy.mapSegyTraces(SH, mode='r')
+        ibm = SH['DataSampleFormat'] == 1
+
+        for a in range(0, ns, self.chunk):
+            samples = traces['data'][rows, a:a + self.chunk]
+            if ibm:
+                samples = pssegy.ibm2ieee(samples)
+            self._block(self.cf(samples.T))
+
+        return len(self.triggers) - before
+
+    def close(self):
+        """
+        End the stream, closing the triggers still on at its last sample.
+        """
+        if self.keys is None:
+            return
+
+        for column in np.flatnonzero(self.on >= 0):
+            self._trigger(column, self.on[column], self.count - 1, self.peak[column])
+            self.on[column] = -1
+
+
+def coincidenceTrigger(triggers, coincidence = 1):
+    """
+    Group the overlapping triggers into events, keeping those seen by at least
+    coincidence distinct receivers.
+    """
+    triggers = sorted(triggers, key = lambda t: (t['on'], t['rcv'], t['code']))
+
+    events = []
+    i = 0
+
+    while i < len(triggers):
+
+        first = triggers[i]
+        off = first['off']
+
+        j = i + 1
+        while j < len(triggers) and triggers[j]['on'] <= off:
+            off = max(off, triggers[j]['off'])
+            j += 1
+
+        members = triggers[i:j]
+        rcvs = sorted(set(t['rcv'] for t in members))
+
+        if len(rcvs) >= coincidence:
+            events.append({'time': first['on'], 'duration': (off - first['on']).astype(np.int64) / 1e+6,
+                           'rcvs': rcvs, 'coincidence': len(rcvs), 'triggers': members})
+
+        i = j
+
+    return events
+
+
+def detectSegyFiles(filelist, nsta, nlta, thr_on, thr_off, coincidence = 1, method = 'recursive_sta_lta',
+                    receivers = None, codes = None, chunk = 10000):
+    """
+    Return (triggers, events) of the STA/LTA detector run over the SEG-Y files
+    of filelist, taken in that order. nsta and nlta are in samples; a trigger
+    turns on above thr_on and off at or below thr_off.
+    """
+    detector = StaLtaDetector(nsta, nlta, thr_on, thr_off, method, receivers, codes, chunk)
+
+    for filename in filelist:
+        detector.feed(filename)
+
+    detector.close()
+
+    return detector.triggers, coincidenceTrigger(detector.triggers, coincidence)
+
+
+def detectSegyArchive(root, nsta, nlta, thr_on, thr_off, coincidence = 1, method = 'recursive_sta_lta',
+                      start = None, end = None, receivers = None, codes = None, chunk = 10000):
+    """
+    Update the index of the SEG-Y directory root and run detectSegyFiles over
+    its files overlapping [start, end), in time order.
+    """
+    index = SegyArchiveIndex(root)
+    index.update()
+
+    mask = index.select(start, end, receivers, codes)
+    fid = index.traces['file'][mask]
+    times = index.traces['time'][mask]
+
+    files = np.unique(fid)
+    first = np.array([times[fid == f].min() for f in files], dtype='datetime64[s]')
+
+    filelist = [transform_separator(os.path.join(index.root, index.files['name'][f]))
+                for f in files[np.argsort(first, kind = 'stable')]]
+
+    return detectSegyFiles(filelist, nsta, nlta, thr_on, thr_off, coincidence, method, receivers, codes, chunk)
+
+
+FILE_PICK_DTYPE = np.dtype([('file', np.int32)] + PICK_DTYPE.descr)
+
+
+def _pickFile(filename, nsta, nlta, p_thres, s_thres, method, threads):
+
+    segy = pssegy.Segy.fromSegyFile(filename, mmap = True)
+
+    return segy.pickPS(nsta, nlta, p_thres, s_thres, method, threads)
+
+
+def pickSegyFiles(filelist, nsta, nlta, p_thres, s_thres, method = 'recursive_sta_lta', workers = 1, threads = None):
+    """
+    Return the Segy.pickPS picks of the files of filelist as one
+    FILE_PICK_DTYPE array, file being the index in filelist and trace the
+    trace index in the file, computed in workers processes of threads threads
+    each (default the CPUs shared among the processes).
+    """
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+
+    args = (nsta, nlta, p_thres, s_thres, method, threads)
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            results = list(executor.map(_pickFile, filelist, *[[a] * len(filelist) for a in args]))
+    else:
+        results = [_pickFile(filename, *args) for filename in filelist]
+
+    picks = np.zeros(sum(len(r) for r in results), dtype = FILE_PICK_DTYPE)
+
+    i = 0
+    for f, r in enumerate(results):
+        picks[i:i + len(r)]['file'] = f
+        for key in PICK_DTYPE.names:
+            picks[key][i:i + len(r)] = r[key]
+        i += len(r)
+
+    return picks
+
+
+def pickSegyDirectory(root, nsta, nlta, p_thres, s_thres, method = 'recursive_sta_lta', workers = None,
+                      threads = None, suffix = '.sgy'):
+    """
+    Return (filelist, picks) of pickSegyFiles over the files of the directory
+    root in name order, with a process per CPU by default.
+    """
+    root = transform_separator(root)
+    filelist = [transform_separator(os.path.join(root, name)) for name in sorted(os.listdir(root)) if name.endswith(suffix)]
+
+    picks = pickSegyFiles(filelist, nsta, nlta, p_thres, s_thres, method, workers or os.cpu_count() or 1, threads)
+
+    return filelist, picks
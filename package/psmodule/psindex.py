@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Header-only index of a directory of SEG-Y files.
+
+Only the binary header and a few trace header fields of each file are read
+(see pssegy.getSegyTraceHeaderView), and kept in a columnar .npz sidecar in
+the archive directory:
+
+    files   : name, size, mtime_ns, ns, dt of every indexed file
+    traces  : file id, trace index, start time, receiver and trace
+              identification code of every trace
+
+The index is updated incrementally: only new or modified files are scanned
+and the traces of removed files are dropped.
+
+    index = SegyArchiveIndex('/data/segy')
+    index.update()
+    index.query('2019-11-11T02:00', '2019-11-11T03:15', receivers=[4017])
+
+A time window can be cut out of consecutive files as one continuous gather,
+reading only the samples inside the window:
+
+    Data, SH, STH = index.extract('2019-11-11T02:00:30', '2019-11-11T02:01:30')
+"""
+
+import os
+import datetime
+
+import numpy as np
+
+from . import pssegy
+from ..utils.utils import transform_separator
+
+
+INDEX_NAME = '.segy-index.npz'
+
+# trace header fields read for every trace
+INDEX_KEYS = ['YearDataRecorded', 'DayOfYear', 'HourOfDay', 'MinuteOfHour', 'SecondOfMinute',
+              'Inline3D', 'TraceIdentificationCode']
+
+FILE_COLUMNS = {'name': np.dtype('U'), 'size': np.int64, 'mtime': np.int64, 'ns': np.int64, 'dt': np.int64}
+
+# trace header fields set to the window start in extracted gathers, the
+# sub-second part of the start going to DelayRecordingTime [ms]
+TIME_KEYS = ['YearDataRecorded', 'DayOfYear', 'HourOfDay', 'MinuteOfHour', 'SecondOfMinute']
+
+TRACE_COLUMNS = {'file': np.int32, 'trace': np.int32, 'time': np.dtype('datetime64[s]'),
+                 'rcv': np.int32, 'code': np.int16}
+
+
+def scanSegyFile(filename):
+    """
+    Return (ns, dt, columns) for one SEG-Y file, columns being the INDEX_KEYS
+    trace header arrays, read without touching the samples.
+    """
+    SH = pssegy.getSegyHeader(filename)
+    view = pssegy.getSegyTraceHeaderView(SH, INDEX_KEYS)
+
+    columns = {key: np.array(view[key]) for key in INDEX_KEYS}
+
+    return int(SH['ns']), int(SH['dt']), columns
+
+
+class SegyArchiveIndex:
+
+    """
+    Index of the .sgy files of a directory, stored as a .npz sidecar in it.
+    """
+
+    def __init__(self, root, suffix='.sgy'):
+
+        self.root = transform_separator(root)
+        self.suffix = suffix
+        self.path = os.path.join(self.root, INDEX_NAME)
+
+        self.files = {key: np.zeros(0, dtype=dtype) for key, dtype in FILE_COLUMNS.items()}
+        self.traces = {key: np.zeros(0, dtype=dtype) for key, dtype in TRACE_COLUMNS.items()}
+
+        if os.path.exists(self.path):
+            self.load()
+
+    def load(self):
+
+        with np.load(self.path) as npz:
+            for key in FILE_COLUMNS:
+                self.files[key] = npz['files_' + key]
+            for key in TRACE_COLUMNS:
+                self.traces[key] = npz['traces_' + key]
+
+    def save(self):
+
+        arrays = {}
+        for key in FILE_COLUMNS:
+            arrays['files_' + key] = self.files[key]
+        for key in TRACE_COLUMNS:
+            arrays['traces_' + key] = self.traces[key]
+
+        # written aside and renamed, so a reader never sees a partial index
+        tmp = self.path + '.part.npz'
+        np.savez(tmp, **arrays)
+        os.replace(tmp, self.path)
+
+    def update(self, save=True):
+        """
+        Scan new and modified files, drop removed ones, and save the sidecar.
+        Return the number of files scanned.
+        """
+        listing = {}
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.name.endswith(self.suffix):
+                stat = entry.stat()
+                listing[entry.name] = (stat.st_size, stat.st_mtime_ns)
+
+        # keep the files that did not change
+        keep = np.array([listing.get(name) == (size, mtime) for name, size, mtime in
+                         zip(self.files['name'], self.files['size'], self.files['mtime'])], dtype=bool)
+
+        newid = np.cumsum(keep) - 1
+        tkeep = keep[self.traces['file']] if len(keep) else np.zeros(0, dtype=bool)
+
+        files = {key: [self.files[key][keep]] for key in FILE_COLUMNS}
+        traces = {key: [self.traces[key][tkeep]] for key in TRACE_COLUMNS}
+        traces['file'] = [newid[self.traces['file'][tkeep]].astype(np.int32)] if len(keep) else traces['file']
+
+        known = set(self.files['name'][keep])
+        nfiles = int(keep.sum())
+        scanned = 0
+
+        for name in sorted(listing):
+
+            if name in known:
+                continue
+
+            try:
+                ns, dt, columns = scanSegyFile(os.path.join(self.root, name))
+            except (ValueError, KeyError, OSError):
+                # not a readable SEG-Y file
+                continue
+
+            ntr = len(columns['Inline3D'])
+
+            size, mtime = listing[name]
+            for key, value in zip(FILE_COLUMNS, [name, size, mtime, ns, dt]):
+                files[key].append(np.array([value]))
+
+            traces['file'].append(np.full(ntr, nfiles, dtype=np.int32))
+            traces['trace'].append(np.arange(ntr, dtype=np.int32))
+            traces['time'].append(pssegy.headerTimes(columns['YearDataRecorded'], columns['DayOfYear'],
+                                                     columns['HourOfDay'], columns['MinuteOfHour'],
+                                                     columns['SecondOfMinute']))
+            traces['rcv'].append(columns['Inline3D'])
+            traces['code'].append(columns['TraceIdentificationCode'])
+
+            nfiles += 1
+            scanned += 1
+
+        self.files = {key: np.concatenate(files[key]).astype(FILE_COLUMNS[key]) for key in FILE_COLUMNS}
+        self.traces = {key: np.concatenate(traces[key]).astype(TRACE_COLUMNS[key]) for key in TRACE_COLUMNS}
+
+        if save and (scanned or not keep.all() or not os.path.exists(self.path)):
+            self.save()
+
+        return scanned
+
+    def select(self, start=None, end=None, receivers=None, codes=None):
+        """
+        Return the boolean mask of the indexed traces whose record overlaps
+        [start, end) and whose receiver and identification code are in the
+        given lists; None means no restriction.
+        """
+        time = self.traces['time'].astype('datetime64[us]')
+        mask = np.ones(len(time), dtype=bool)
+
+        # microseconds, so that a window bound inside a second is not truncated
+        if start is not None or end is not None:
+            fid = self.traces['file']
+            duration = self.files['ns'][fid].astype(np.int64) * self.files['dt'][fid]
+            if start is not None:
+                mask &= time + duration.astype('timedelta64[us]') > np.datetime64(start, 'us')
+            if end is not None:
+                mask &= time < np.datetime64(end, 'us')
+
+        if receivers is not None:
+            mask &= np.isin(self.traces['rcv'], receivers)
+
+        if codes is not None:
+            mask &= np.isin(self.traces['code'], codes)
+
+        return mask
+
+    def query(self, start=None, end=None, receivers=None, codes=None):
+        """
+        Return [(file, trace index), ...] of the selected traces, in time order,
+        file being the full path. See select for the arguments.
+        """
+        mask = self.select(start, end, receivers, codes)
+
+        sel = np.nonzero(mask)[0]
+        sel = sel[np.lexsort((self.traces['trace'][sel], self.traces['file'][sel], self.traces['time'][sel]))]
+
+        names = self.files['name']
+
+        return [(transform_separator(os.path.join(self.root, names[f])), int(t))
+                for f, t in zip(self.traces['file'][sel], self.traces['trace'][sel])]
+
+    def extract(self, start, end, receivers=None, codes=None, fill=0):
+        """
+        Return (Data, SH, STH) of the [start, end) window as one gather with a
+        trace per receiver and identification code, samples spliced from all
+        the files overlapping the window. Samples not covered by any file are
+        set to fill. Only the sample ranges inside the window are read, through
+        np.memmap, so the I/O does not depend on the file length.
+        The headers are those of the first trace of each receiver and code in
+        the window, with ns, the sequence numbers and the record time of the
+        window start: its whole seconds in the date and time fields and the
+        rest in DelayRecordingTime [ms]. start must be a whole millisecond.
+        """
+        start = np.datetime64(start, 'us')
+        end = np.datetime64(end, 'us')
+
+        delay = (start - start.astype('datetime64[s]')).astype(np.int64)
+        if delay % 1000:
+            raise ValueError("The window start " + str(start) + " is not a whole millisecond, "
+                             "the trace headers cannot hold it")
+
+        sel = np.nonzero(self.select(start, end, receivers, codes))[0]
+
+        if len(sel) == 0:
+            raise ValueError("No indexed trace between " + str(start) + " and " + str(end))
+
+        sel = sel[np.lexsort((self.traces['trace'][sel], self.traces['file'][sel], self.traces['time'][sel]))]
+
+        fid = self.traces['file'][sel]
+        itrace = self.traces['trace'][sel]
+
+        dts = np.unique(self.files['dt'][fid])
+        if len(dts) > 1:
+            raise ValueError("Files of the window have different sampling intervals: " + str(dts))
+        dt = int(dts[0])
+
+        # one output trace per receiver and code, ordered by receiver then file order
+        pair = self.traces['rcv'][sel].astype(np.int64) * 65536 + self.traces['code'][sel]
+        pairs, first, column = np.unique(pair, return_index=True, return_inverse=True)
+        order = np.lexsort((itrace[first], self.traces['rcv'][sel][first]))
+        column = np.argsort(order)[column.ravel()]
+
+        ns = int(-(-(end - start).astype(np.int64) // dt))
+        offset = (self.traces['time'][sel].astype('datetime64[us]') - start).astype(np.int64) // dt
+
+        Data = None
+        SH = None
+        STH = None
+
+        for f in np.unique(fid):
+
+            fSH = pssegy.getSegyHeader(transform_separator(os.path.join(self.root, self.files['name'][f])))
+            traces = pssegy.mapSegyTraces(fSH, mode='r')
+            ibm = fSH['DataSampleFormat'] == 1
+
+            if Data is None:
+                dtype = np.float32 if ibm else pssegy.getSampleDtype(fSH).newbyteorder('=')
+                Data = np.full((ns, len(pairs)), fill, dtype=dtype)
+                SH = dict(fSH)
+                STH = {key: np.zeros(len(pairs), dtype=np.int64) for key in pssegy.STH_LAYOUT.names}
+
+            infile = fid == f
+
+            # headers of the first trace of each output column found in this file
+            headers = pssegy.getSegyTraceHeaderView(fSH)
+            for i in np.nonzero(infile)[0]:
+                if i == first[np.searchsorted(pairs, pair[i])]:
+                    for key in STH:
+                        STH[key][column[i]] = headers[itrace[i]][key]
+
+            # traces starting at the same sample of the window are read together
+            for o in np.unique(offset[infile]):
+                rows = infile & (offset == o)
+                a = max(0, -o)
+                b = min(int(fSH['ns']), ns - o)
+                if b <= a:
+                    continue
+                samples = traces['data'][itrace[rows], a:b]
+                Data[o + a:o + b, column[rows]] = (pssegy.ibm2ieee(samples) if ibm else samples).T
+
+        t0 = start.astype('datetime64[s]').astype(datetime.datetime)
+
+        SH['ns'] = ns
+        SH['ntraces'] = len(pairs)
+        SH['time'] = np.arange(ns) * dt / 1e+6
+
+        STH['ns'][:] = ns
+        STH['TraceSequenceLine'] = np.arange(1, len(pairs) + 1)
+        STH['TraceSequenceFile'] = np.arange(1, len(pairs) + 1)
+        STH['TraceNumber'] = np.arange(1, len(pairs) + 1)
+        for key, value in zip(TIME_KEYS, [t0.year, t0.timetuple().tm_yday, t0.hour, t0.minute, t0.second]):
+            STH[key][:] = value
+        STH['DelayRecordingTime'][:] = delay // 1000
+
+        return Data, SH, STH
+
+
+def extractSegyWindow(root, start, end, receivers=None, codes=None, outfile=None, fill=0):
+    """
+    Update the index of the SEG-Y directory root and return (Data, SH, STH) of
+    the [start, end) window, see SegyArchiveIndex.extract. With outfile, the
+    gather is also written there in the sample format of the source files.
+    """
+    index = SegyArchiveIndex(root)
+    index.update()
+
+    Data, SH, STH = index.extract(start, end, receivers, codes, fill)
+
+    if outfile is not None:
+
+        if SH['ns'] > 65535:
+            raise ValueError("A SEG-Y trace holds at most 65535 samples, the window has " + str(SH['ns']))
+
+        with pssegy.SegyWriter(outfile, dict(SH)) as w:
+            w.append(Data, STH)
+
+    return Data, SH, STH
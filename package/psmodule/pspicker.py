@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+STA/LTA characteristic functions and trigger onset detection.
+
+The characteristic functions take a trace or a (ns, ntr) matrix of traces and
+work along the first axis, all traces at once:
+
+    classic_sta_lta     STA and LTA windows ending at the same sample, by cumulative sums
+    delayed_sta_lta     LTA window ending where the STA window starts, by cumulative sums
+    recursive_sta_lta   exponential STA and LTA, as a first order recursive filter
+
+The first nlta samples, where the LTA is not yet established, are set to 0.
+StreamingStaLta computes any of them over consecutive blocks of a continuous
+record, carrying the LTA state from one block to the next.
+
+pickOnsets gives the trigger onsets of all the traces of a characteristic
+function matrix as one PICK_DTYPE array.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.signal import lfilter
+
+
+def _squares(a):
+
+    a = np.asarray(a, dtype=np.float64)
+
+    return a * a
+
+
+def _window_sums(sq, n):
+    """
+    Sums of sq over the n samples ending at each sample (fewer at the start).
+    """
+    cs = np.cumsum(sq, axis=0)
+    cs[n:] = cs[n:] - cs[:-n].copy()
+
+    return cs
+
+
+def _ratio(sta, lta):
+
+    tiny = np.finfo(np.float64).tiny
+
+    return sta / np.maximum(lta, tiny)
+
+
+def classic_sta_lta(a, nsta, nlta):
+    """
+    Classic STA/LTA of a, both windows ending at the current sample.
+    """
+    sq = _squares(a)
+
+    sta = _window_sums(sq, nsta) / nsta
+    lta = _window_sums(sq, nlta) / nlta
+
+    cf = _ratio(sta, lta)
+    cf[:nlta - 1] = 0
+
+    return cf
+
+
+def delayed_sta_lta(a, nsta, nlta):
+    """
+    Delayed STA/LTA of a: the LTA window covers the nlta samples preceding the
+    STA window, so that the onset does not raise the LTA while it is detected.
+    """
+    sq = _squares(a)
+
+    sta = _window_sums(sq, nsta) / nsta
+    lta = np.zeros_like(sta)
+    lta[nsta:] = _window_sums(sq, nlta)[:-nsta] / nlta
+
+    cf = _ratio(sta, lta)
+    cf[:nsta + nlta - 1] = 0
+
+    return cf
+
+
+def _recursive_average(sq, c, z):
+    """
+    y[i] = c * sq[i] + (1 - c) * y[i - 1] along axis 0, y[-1] = z.
+    Return y and its last row.
+    """
+    y, zf = lfilter([c], [1.0, c - 1.0], sq, axis=0, zi=((1.0 - c) * z)[np.newaxis])
+
+    return y, y[-1] if len(y) else z
+
+
+class RecursiveStaLta:
+    """
+    Recursive STA/LTA over consecutive blocks of a continuous record, with the
+    STA and LTA state of every trace carried from one block to the next:
+
+        cf = RecursiveStaLta(nsta, nlta)
+        for block in blocks:          # (ns, ntr) arrays
+            out = cf(block)
+    """
+
+    def __init__(self, nsta, nlta):
+
+        self.nsta = nsta
+        self.nlta = nlta
+        self.reset()
+
+    def reset(self):
+
+        self.sta = None
+        self.lta = None
+        self.count = 0
+
+    def __call__(self, a):
+
+        sq = _squares(a)
+
+        if self.sta is None:
+            self.sta = np.zeros(sq.shape[1:])
+            self.lta = np.zeros(sq.shape[1:])
+
+        sta, self.sta = _recursive_average(sq, 1.0 / self.nsta, self.sta)
+        lta, self.lta = _recursive_average(sq, 1.0 / self.nlta, self.lta)
+
+        cf = _ratio(sta, lta)
+
+        # LTA still warming up
+        if self.count < self.nlta:
+            cf[:self.nlta - self.count] = 0
+
+        self.count += len(sq)
+
+        return cf
+
+
+def recursive_sta_lta(a, nsta, nlta):
+    """
+    Recursive STA/LTA of a, with exponential windows of nsta and nlta samples.
+    """
+    return RecursiveStaLta(nsta, nlta)(a)
+
+
+def trigger_onset(charfct, thres1, thres2, max_len=9e99, max_len_delete=False):
+    """
+    Return the (n, 2) array of [on, off] sample indices of the triggers of the
+    characteristic function charfct: a trigger turns on at the first sample
+    above thres1 and off at the last sample above thres2 after it.
+    A trigger still on at the end of charfct ends at its last sample.
+    Triggers longer than max_len samples are cut to max_len, or dropped
+    with max_len_delete.
+    """
+    charfct = np.asarray(charfct)
+
+    above = np.flatnonzero(charfct > thres1)
+
+    if len(above) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    # first sample not above thres2 following each sample
+    below = np.flatnonzero(charfct <= thres2)
+
+    triggers = []
+    end = -1
+
+    i = 0
+    while i < len(above):
+
+        on = above[i]
+        k = np.searchsorted(below, on)
+        off = below[k] - 1 if k < len(below) else len(charfct) - 1
+
+        if off - on + 1 > max_len:
+            if not max_len_delete:
+                triggers.append((on, on + int(max_len) - 1))
+        else:
+            triggers.append((on, off))
+
+        end = off
+        i = np.searchsorted(above, end, side='right')
+
+    return np.array(triggers, dtype=np.int64).reshape(-1, 2)
+
+
+class StreamingStaLta:
+    """
+    STA/LTA over consecutive (ns, ntr) blocks of a continuous record, giving
+    the same values as over the whole record at once. The recursive method
+    carries its filter state, the others the last nsta + nlta samples.
+    """
+
+    def __init__(self, nsta, nlta, method = 'recursive_sta_lta'):
+
+        self.nsta = nsta
+        self.nlta = nlta
+        self.method = method
+        self.reset()
+
+    def reset(self):
+
+        self.recursive = RecursiveStaLta(self.nsta, self.nlta) if self.method == 'recursive_sta_lta' else None
+        self.tail = None
+
+    def __call__(self, a):
+
+        if self.recursive is not None:
+            return self.recursive(a)
+
+        a = np.asarray(a, dtype=np.float64)
+
+        if self.tail is None:
+            self.tail = a[:0]
+
+        x = np.concatenate([self.tail, a])
+        cf = STA_LTA_METHODS[self.method](x, self.nsta, self.nlta)[len(self.tail):]
+
+        self.tail = x[-(self.nsta + self.nlta):]
+
+        return cf
+
+
+STA_LTA_METHODS = {'classic_sta_lta': classic_sta_lta,
+                   'delayed_sta_lta': delayed_sta_lta,
+                   'recursive_sta_lta': recursive_sta_lta}
+
+
+# phase codes of the picks
+PHASES = ['P', 'S']
+
+PICK_DTYPE = np.dtype([('trace', np.int32), ('sample', np.int64), ('phase', np.int8), ('cf', np.float32)])
+
+
+def _pickColumns(cfs, columns, thres1, thres2, phase):
+
+    picks = []
+    for column in columns:
+        onsets = trigger_onset(cfs[:, column], thres1, thres2)[:, 0]
+        p = np.empty(len(onsets), dtype=PICK_DTYPE)
+        p['trace'] = column
+        p['sample'] = onsets
+        p['phase'] = phase
+        p['cf'] = cfs[onsets, column]
+        picks.append(p)
+
+    return np.concatenate(picks) if picks else np.zeros(0, dtype=PICK_DTYPE)
+
+
+def pickOnsets(cfs, thres1, thres2=None, phase=0, workers=None):
+    """
+    Return the PICK_DTYPE array of the trigger onsets of every column of the
+    (ns, ntr) characteristic functions cfs, ordered by trace and sample:
+    trace (column), sample, phase (index in PHASES) and cf (value at the onset).
+    thres2 defaults to thres1. Only the traces going above thres1 are searched,
+    split over a pool of workers threads (default one per CPU).
+    """
+    if thres2 is None:
+        thres2 = thres1
+
+    cfs = np.asarray(cfs)
+    if cfs.ndim == 1:
+        cfs = cfs.reshape(-1, 1)
+
+    columns = np.flatnonzero((cfs > thres1).any(axis=0))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or len(columns) < 2:
+        return _pickColumns(cfs, columns, thres1, thres2, phase)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(lambda c: _pickColumns(cfs, c, thres1, thres2, phase),
+                                  np.array_split(columns, min(workers, len(columns)))))
+
+    return np.concatenate(parts)
@@ -8,8 +8,11 @@ segy.getAllSegyTraceHeaders : Get all SEGY Trace headers
 segy.getSegyTrace            : Get SEGY Trace heder and trace data for one trace
 segy.writeSegy                : Write a data to a SEGY file
 segy.writeSegyStructure     : Writes a segy data structure to a SEGY file
+segy.mergeSegy              : Concatenate the traces of SEGY files
+segy.mergeSegyContinuous    : Join SEGY files along time into hourly or daily records
 segy.getValue         : Get a value from a binary string
 segy.ibm2ieee        : Convert IBM floats to IEEE
+segy.ieee2ibm        : Convert IEEE floats to IBM
 
 """
 #
@@ -23,16 +26,19 @@ from __future__ import print_function
 import os
 import struct, sys 
 import re
+import json
+import warnings
 
 import datetime
+from fractions import Fraction
+from collections.abc import MutableMapping
 import numpy as np
 import pandas as pd
+from scipy.signal import resample_poly
 
 
 
-from PyQt5.QtWidgets import QMessageBox
-
-# from ..psmodule.pspicker import recursive_sta_lta, delayed_sta_lta, classic_sta_lta
+from ..psmodule.pspicker import STA_LTA_METHODS, pickOnsets
 
 from ..utils.utils import load_dict, transform_separator
 
@@ -45,7 +51,7 @@ endian='<' # Little Endian
 endian='=' # Native
 
 
-NUMPY_DTYPES = {'ibm':     np.dtype('>f4'),
+NUMPY_DTYPES = {'ibm':     np.dtype('>u4'), # raw IBM float words, see ibm2ieee/ieee2ibm
 
                 'int32':   np.dtype('>i4'),
 
@@ -60,6 +66,12 @@ NUMPY_DTYPES = {'ibm':     np.dtype('>f4'),
 
 
 
+# DataSampleFormat codes of the sample formats written
+DSF_CODES = {'ibm': 1, 'int32': 2, 'int16': 3, 'float32': 5, 'int8': 8}
+
+SEGY_REV2 = 0x0200
+SEGY_BYTE_ORDER_MARKER = 0x01020304
+
 SEGY_ASCII_REEL_HEADER_BYTES=3200
 SEGY_ASCII_REEL_HEADER_RECORD_BYTES=80
 SEGY_BIN_REEL_HEADER_BYTES=400
@@ -95,103 +107,6 @@ VOLUME_HEADER_TYPE = np.dtype([('Job', '>i4'),\
                             ])
 
 
-TRACES_HEADER_TYPE = np.dtype( [ ('TraceSequenceLine' , '>i4'), \
-                                ('TraceNumber' , '>i4'), \
-                                ('FieldRecord' , '>i4'), \
-                                 ('TraceSequenceFile' , '>i4'),\
-                                 ('EnergySourcePoint' , '>i4'), \
-                                 ('cdp' , '>i4'), \
-                                ('cdpTrace' , '>i4'), \
-                                ('TraceIdentificationCode' , '>u2'), \
-                                ('NSummedTraces' , '>u2'), \
-                                ('NStackedTraces' , '>u2'), \
-                                ('DataUse' , '>u2'),\
-                                ('offset' , '>i4'), \
-                                ('ReceiverGroupElevation' , '>i4'), \
-                                ('SourceSurfaceElevation' , '>i4'), \
-                                ('SourceDepth' , '>i4'), \
-                                ('ReceiverDatumElevation' , '>i4'), \
-                                ('SourceDatumElevation' , '>i4'), \
-                                ('SourceWaterDepth' , '>i4'), \
-                                ('GroupWaterDepth' , '>i4'),\
-                                ('ElevationScalar' , '>i2'), \
-                                ('SourceGroupScalar' , '>i2'), \
-                                ('SourceX' , '>i4'), \
-                                ('SourceY' , '>i4'), \
-                                ('GroupX' , '>i4'), \
-                                ('GroupY' , '>i4'), \
-                                ('CoordinateUnits' , '>u2'),\
-                                ('WeatheringVelocity' , '>u2'), \
-                                ('SubWeatheringVelocity' , '>u2'), \
-                                ('SourceUpholeTime' , '>u2'), \
-                                ('GroupUpholeTime' , '>u2'), \
-                                ('SourceStaticCorrection' , '>u2'), \
-                                ('GroupStaticCorrection' , '>u2'), \
-                                ('TotalStaticApplied' , '>u2'), \
-                                ('LagTimeA' , '>i2'), \
-                                ('LagTimeB' , '>i2'), \
-                                ('DelayRecordingTime' , '>i2'), \
-                                ('MuteTimeStart' , '>u2'), \
-                                ('MuteTimeEND' , '>u2'), \
-                                ('ns' , '>u2'), \
-                                ('dt' , '>u2'), \
-                                ('GainType' , '>u2'), \
-                                ('InstrumentGainConstant' , '>u2'), \
-                                ('InstrumentInitialGain' , '>u2'), \
-                                ('Correlated' , '>u2'), \
-                                ('SweepFrequenceStart' , '>u2'), \
-                                ('SweepFrequenceEnd' , '>u2'), \
-                                ('SweepLength' , '>u2'), \
-                                ('SweepType' , '>u2'), \
-                                ('SweepTraceTaperLengthStart' , '>u2'), \
-                                ('SweepTraceTaperLengthEnd' , '>u2'), \
-                                ('TaperType' , '>u2'), \
-                                ('AliasFilterFrequency' , '>u2'), \
-                                ('AliasFilterSlope' , '>u2'), \
-                                ('NotchFilterFrequency' , '>u2'), \
-                                ('NotchFilterSlope' , '>u2'), \
-                                ('LowCutFrequency' , '>u2'), \
-                                ('HighCutFrequency' , '>u2'), \
-                                ('LowCutSlope' , '>u2'), \
-                                ('HighCutSlope' , '>u2'), \
-                                ('YearDataRecorded' , '>u2'), \
-                                ('DayOfYear' , '>u2'), \
-                                ('HourOfDay' , '>u2'), \
-                                ('MinuteOfHour' , '>u2'), \
-                                ('SecondOfMinute' , '>u2'), \
-                                ('TimeBaseCode' , '>u2'), \
-                                ('TraceWeightningFactor' , '>u2'), \
-                                ('GeophoneGroupNumberRoll1' , '>u2'), \
-                                ('GeophoneGroupNumberFirstTraceOrigField' , '>u2'), \
-                                ('GeophoneGroupNumberLastTraceOrigField' , '>u2'), \
-                                ('GapSize' , '>u2'), \
-                                ('OverTravel' , '>u2'),\
-                                ('cdpX' , '>i4'),\
-                                ('cdpY' , '>i4'),\
-                                ('Inline3D' , '>i4'),\
-                                ('Crossline3D' , '>i4'),\
-                                ('ShotPoint' , '>i4'),\
-                                ('ShotPointScalar' , '>i2'),\
-                                ('TraceValueMeasurementUnit' , '>u2'),\
-                                ('TransductionConstantMantissa' , '>i4'),\
-                                ('TransductionConstantPower' , '>u2'),\
-                                ('TransductionUnit' , '>u2'),\
-                                ('TraceIdentifier' , '>u2'),\
-                                ('ScalarTraceHeader' , '>i2'),\
-                                ('SourceType' , '>u2'),\
-                                ('SourceEnergyDirectionMantissa' , '>i4'),\
-                                ('SourceEnergyDirectionExponent' , '>u2'),\
-                                ('SourceMeasurementMantissa' , '>i4'),\
-                                ('SourceMeasurementExponent' , '>u2'),\
-                                ('SourceMeasurementUnit' , '>u2'),\
-                                ('UnassignedInt1' , '>i4'),\
-                                ('UnassignedInt2' , '>i4')])
-
-
-
-
-
-
 l_int = struct.calcsize('i')
 l_uint = struct.calcsize('I')
 l_long = 4
@@ -293,6 +208,7 @@ SH_def["MeasurementSystem"] = {"pos": 3254, "type": "int16", "def": 0}
 SH_def["ImpulseSignalPolarity"] = {"pos": 3256, "type": "int16", "def": 0}
 SH_def["VibratoryPolarityCode"] = {"pos": 3258, "type": "int16", "def": 0}
 SH_def["Unassigned1"] = {"pos": 3260, "type": "int16", "n": 120, "def": 0}
+SH_def["ByteOrderMarker"] = {"pos": 3296, "type": "int32", "def": 0}  # rev2, 16909060 in the file byte order
 SH_def["SegyFormatRevisionNumber"] = {"pos": 3500, "type": "uint16", "def": 100}
 SH_def["FixedLengthTraceFlag"] = {"pos": 3502, "type": "uint16", "def": 0}
 SH_def["NumberOfExtTextualHeaders"] = {"pos": 3504, "type": "uint16", "def": 0}
@@ -386,7 +302,7 @@ STH_def["MuteTimeStart"] = {"pos": 110, "type": "int16"}  # 'int16');  %110
 STH_def["MuteTimeEND"] = {"pos": 112, "type": "int16"}  # 'int16');  %112
 STH_def["ns"] = {"pos": 114, "type": "uint16"}  # 'uint16');  %114
 STH_def["dt"] = {"pos": 116, "type": "uint16"}  # 'uint16');  %116
-STH_def["GainType"] = {"pos": 119, "type": "int16"}  # 'int16');  %118
+STH_def["GainType"] = {"pos": 118, "type": "int16"}  # 'int16');  %118
 STH_def["GainType"]["descr"] = {0: {
     1: "Fixes",
     2: "Binary",
@@ -459,7 +375,7 @@ STH_def["cdpX"] = {"pos": 180, "type": "int32"}  # 'int32');  %180
 STH_def["cdpY"] = {"pos": 184, "type": "int32"}  # 'int32');  %184
 STH_def["Inline3D"] = {"pos": 188, "type": "int32"}  # 'int32');  %188
 STH_def["Crossline3D"] = {"pos": 192, "type": "int32"}  # 'int32');  %192
-STH_def["ShotPoint"] = {"pos": 192, "type": "int32"}  # 'int32');  %196
+STH_def["ShotPoint"] = {"pos": 196, "type": "int32"}  # 'int32');  %196
 STH_def["ShotPointScalar"] = {"pos": 200, "type": "int16"}  # 'int16');  %200
 STH_def["TraceValueMeasurementUnit"] = {"pos": 202, "type": "int16"}  # 'int16');  %202
 STH_def["TraceValueMeasurementUnit"]["descr"] = {1: {
@@ -513,6 +429,97 @@ STH_def["UnassignedInt1"] = {"pos": 232, "type": "int32"}  # 'int32');  %232
 STH_def["UnassignedInt2"] = {"pos": 236, "type": "int32"}  # 'int32');  %236
 
 
+##############
+# %%  Compiled header layouts
+STRUCT_CODES = {'int32': 'l', 'uint32': 'L', 'int16': 'h', 'uint16': 'H', 'float32': 'f', 'int8': 'b'}
+
+
+class HeaderLayout:
+    """
+    Byte layout of a header compiled once from a SH_def/STH_def style dict:
+    field offsets, numpy dtypes and struct formats for both byte orders.
+
+        SH_LAYOUT.dtype('>')                      400 bytes binary header
+        STH_LAYOUT.dtype('<', keys, itemsize)     subset of the trace header fields,
+                                                  strided over itemsize bytes
+
+    Fields whose bytes overlap another field are listed in overlaps; writers
+    may copy whole headers as blocks only when disjoint is True.
+    """
+
+    def __init__(self, definition, base=0, itemsize=240):
+
+        self.names = list(definition.keys())
+        self.types = {key: definition[key]["type"] for key in self.names}
+        self.offsets = {key: definition[key]["pos"] - base for key in self.names}
+        self.sizes = {key: NUMPY_DTYPES[self.types[key]].itemsize for key in self.names}
+        self.itemsize = itemsize
+
+        self.structs = {}
+        for endian in ['>', '<']:
+            self.structs[endian] = {key: struct.Struct(endian + STRUCT_CODES[self.types[key]]) for key in self.names}
+        self.structs['='] = self.structs['<' if sys.byteorder == 'little' else '>']
+
+        self.overlaps = []
+        fields = sorted(self.names, key=lambda key: self.offsets[key])
+        for a, b in zip(fields[:-1], fields[1:]):
+            if self.offsets[a] + self.sizes[a] > self.offsets[b]:
+                self.overlaps.append((a, b))
+
+        self.disjoint = not self.overlaps
+
+        self._dtypes = {}
+
+    def dtype(self, endian='>', keys=None, itemsize=None):
+        """
+        Structured dtype of the fields keys (default all) at their offsets.
+        """
+        keys = tuple(self.names) if keys is None else tuple(keys)
+        itemsize = self.itemsize if itemsize is None else int(itemsize)
+
+        dtype = self._dtypes.get((endian, keys, itemsize))
+
+        if dtype is None:
+            dtype = np.dtype({'names': list(keys),
+                              'formats': [NUMPY_DTYPES[self.types[key]].newbyteorder(endian) for key in keys],
+                              'offsets': [self.offsets[key] for key in keys],
+                              'itemsize': itemsize})
+            self._dtypes[(endian, keys, itemsize)] = dtype
+
+        return dtype
+
+    def unpack(self, buf, endian='>'):
+        """
+        Dict of the python values of all fields of one header in buf.
+        """
+        record = np.frombuffer(buf, dtype=self.dtype(endian), count=1)[0]
+
+        return {key: record[key].item() for key in self.names}
+
+    def pack(self, values, endian='>'):
+        """
+        Bytes of one header from a dict of values, truncated to integers like putValue.
+        Missing fields are 0. Overlapping fields are written in definition order,
+        the last one wins.
+        """
+        buf = bytearray(self.itemsize)
+        for key in self.names:
+            self.structs[endian][key].pack_into(buf, self.offsets[key], int(values.get(key, 0)))
+
+        return bytes(buf)
+
+
+SH_LAYOUT = HeaderLayout(SH_def, SEGY_ASCII_REEL_HEADER_BYTES, SEGY_BIN_REEL_HEADER_BYTES)
+STH_LAYOUT = HeaderLayout(STH_def, 0, 240)
+
+for layout_name, layout in [('SH_def', SH_LAYOUT), ('STH_def', STH_LAYOUT)]:
+    for a, b in layout.overlaps:
+        warnings.warn(layout_name + ": fields " + a + " and " + b + " overlap")
+
+# big endian trace header dtype used by the readers
+TRACES_HEADER_TYPE = STH_LAYOUT.dtype('>')
+
+
 
 ##############
 # %% FUNCTIONS
@@ -653,122 +660,289 @@ def getDefaultSegyHeader(ntraces=100, ns=100, dt = 1000):
     return SH
 
 
+# %%
+class SegyTraceHeaders(MutableMapping):
+    """
+    Trace headers of ntraces traces held in one structured array with the
+    on-disk layout of STH_def (240 bytes per trace, see getTraceHeaderDtype).
+    Columns are accessed like the dict of arrays returned by readSegy:
+
+        STH = SegyTraceHeaders(ntraces)
+        STH['Inline3D'] = rcvs
+        STH['TraceIdentificationCode'][0::3] = 14
+
+    STH[key] is a view on the record array, values assigned are cast to the
+    field type. tobytes() gives the trace headers as written in the file.
+    Fields overlapping in STH_def share their bytes.
+    """
+
+    def __init__(self, ntraces=0, endian='>', data=None):
+
+        if data is None:
+            data = np.zeros(ntraces, dtype=getTraceHeaderDtype(endian))
+
+        self.data = data
+
+    @classmethod
+    def fromBytes(cls, buf, endian='>'):
+        """
+        Trace headers from the concatenated 240 bytes headers of buf.
+        """
+        return cls(data=np.frombuffer(buf, dtype=getTraceHeaderDtype(endian)).copy())
+
+    @property
+    def ntraces(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        raise TypeError("SegyTraceHeaders fields cannot be removed")
+
+    def __iter__(self):
+        return iter(self.data.dtype.names)
+
+    def __len__(self):
+        return len(self.data.dtype.names)
+
+    def copy(self):
+        return SegyTraceHeaders(data=self.data.copy())
+
+    def tobytes(self):
+        return self.data.tobytes()
+
+
 # %%
 def getDefaultSegyTraceHeaders(ntraces=100, ns=100, dt=1000):
     """
-    SH=getDefaultSegyTraceHeader()
+    STH=getDefaultSegyTraceHeaders(ntraces,ns,dt)
+    Zeroed SegyTraceHeaders with the trace sequence numbers, FieldRecord, ns and dt set.
     """
-    # INITIALIZE DICTIONARY
-    STH = {"TraceSequenceLine": {"pos": 0, "type": "int32"}}
+    STH = SegyTraceHeaders(ntraces)
 
-    for key in STH_def.keys():
+    seq = np.arange(1, ntraces + 1)
+
+    STH["TraceSequenceLine"] = seq
+    STH["TraceSequenceFile"] = seq
+    STH["FieldRecord"] = 1000
+    STH["TraceNumber"] = seq
+    STH["ns"] = ns
+    STH["dt"] = dt
 
-        tmpkey = STH_def[key]
-        if ('def' in tmpkey):
-            val = tmpkey['def']
-        else:
-            val = 0
-        STH[key] = np.zeros(ntraces)
-
-    for a in range(ntraces):
-        STH["TraceSequenceLine"][a] = a + 1
-        STH["TraceSequenceFile"][a] = a + 1
-        STH["FieldRecord"][a] = 1000
-        STH["TraceNumber"][a] = a + 1
-        STH["ns"][a] = ns
-        STH["dt"][a] = dt
     return STH
 
 
 # %%
-def getSegyTraceHeader(SH, THN='cdp', data='none', endian='>'):  # modified by A Squelch
+def getSegyHeaderDtype(endian='>'):
     """
-    getSegyTraceHeader(SH,TraceHeaderName)
+    dtype=getSegyHeaderDtype(endian)
+    Structured numpy dtype of the 400 bytes binary header, see SH_LAYOUT.
+    Offsets are relative to byte 3200 of the file.
     """
+    return SH_LAYOUT.dtype(endian)
 
-    bps = getBytePerSample(SH)
 
-    if (data == 'none'):
-        data = open(SH["filename"], 'rb').read()
+# %%
+def getTraceHeaderDtype(endian='>'):
+    """
+    dtype=getTraceHeaderDtype(endian)
+    Structured numpy dtype of the 240 bytes trace header, see STH_LAYOUT.
+    """
+    return STH_LAYOUT.dtype(endian)
 
-    # MAKE SOME LOOKUP TABLE THAT HOLDS THE LOCATION OF HEADERS
-    #    THpos=TraceHeaderPos[THN]
-    THpos = STH_def[THN]["pos"]
-    THformat = STH_def[THN]["type"]
-    ntraces = int(SH["ntraces"])
-    thv = np.zeros(ntraces)
-    for itrace in range(1, ntraces + 1, 1):
-        i = itrace
-        pos = THpos + 3600 + (SH["ns"] * bps + 240) * (itrace - 1);
 
-        # txt = "getSegyTraceHeader : Reading trace header " + THN + " " + str(itrace) + " of " + str(
-        #     ntraces) + " " + str(pos)
+# %%
+def setSegyFormat(SH, dsf=5, endian='>'):
+    """
+    SH=setSegyFormat(SH,dsf,endian)
+    Set the DataSampleFormat of SH (1 IBM float, 2 int32, 3 int16, 5 IEEE float, 8 int8)
+    and, for little endian output, SEG-Y rev2 with its byte order marker.
+    """
+    if dsf not in DSF_CODES.values():
+        raise ValueError("DSF=" + str(dsf) + ", NOT SUPORTED")
 
+    SH["DataSampleFormat"] = dsf
 
-        thv[itrace - 1], index = getValue(data, pos, THformat, endian, 1)
-        # txt = "getSegyTraceHeader : " + THN + "=" + str(thv[itrace - 1])
-        
+    if endian == '<':
+        SH["SegyFormatRevisionNumber"] = SEGY_REV2
+        SH["ByteOrderMarker"] = SEGY_BYTE_ORDER_MARKER
 
-    return thv
+    return SH
 
 
 # %%
-def getLastSegyTraceHeader(SH, THN='cdp', data='none', endian='>'):  # added by A Squelch
+def checkSampleRange(Data, sample_dtype):
     """
-    getLastSegyTraceHeader(SH,TraceHeaderName)
+    checkSampleRange(Data,sample_dtype)
+    Raise a ValueError when Data holds values an integer sample_dtype cannot
+    represent (out of its range, or not finite), instead of letting the cast wrap.
+    """
+    sample_dtype = np.dtype(sample_dtype)
+
+    if sample_dtype.kind not in 'iu':
+        return
+
+    Data = np.asarray(Data)
+
+    if Data.size == 0 or np.can_cast(Data.dtype, sample_dtype.newbyteorder('=')):
+        return
+
+    info = np.iinfo(sample_dtype)
+    lo = Data.min()
+    hi = Data.max()
+
+    if not (np.isfinite(lo) and np.isfinite(hi)) or lo < info.min or hi > info.max:
+        raise ValueError("Samples in [" + str(lo) + ", " + str(hi) + "] do not fit the " + str(sample_dtype.newbyteorder('=')) +
+                         " SEG-Y sample format [" + str(info.min) + ", " + str(info.max) + "], choose a wider format")
+
+
+# %%
+def packSegyHeader(SH, endian='>'):
+    """
+    buf=packSegyHeader(SH,endian)
+    Return the 3600 bytes file header (empty textual header + binary header)
+    """
+    return bytes(SEGY_ASCII_REEL_HEADER_BYTES) + SH_LAYOUT.pack(SH, endian)
+
+
+# %%
+def writeSegyTraces(f, Data, STH, ns, ntraces, sample_dtype, endian='>', chunk_bytes=2**26, ibm=False):
+    """
+    writeSegyTraces(f,Data,STH,ns,ntraces,sample_dtype,endian)
+    Write trace headers and trace data at the current position of f.
+    Traces are assembled as a structured array in blocks of about chunk_bytes
+    and written with one call per block. With ibm=True the samples are
+    encoded to IBM floats and sample_dtype must be a 4 bytes unsigned type.
+    Samples out of the range of an integer sample_dtype raise a ValueError
+    before anything is written.
     """
+    if not ibm:
+        checkSampleRange(Data, sample_dtype)
+
+    trace_dtype = np.dtype([('header', getTraceHeaderDtype(endian)),
+                            ('data', np.dtype(sample_dtype).newbyteorder(endian), (ns,))])
+
+    step = max(1, int(chunk_bytes // trace_dtype.itemsize))
+
+    for i0 in range(0, ntraces, step):
+        i1 = min(i0 + step, ntraces)
+        block = np.zeros(i1 - i0, dtype=trace_dtype)
+        header = block['header']
+        if isinstance(STH, SegyTraceHeaders) and STH.data.dtype == header.dtype and STH_LAYOUT.disjoint:
+            header[:] = STH.data[i0:i1]
+        else:
+            for key in STH_LAYOUT.names:
+                # int() semantics of putValue: truncate towards zero
+                header[key] = np.asarray(STH[key][i0:i1]).astype(np.int64)
+        if ibm:
+            block['data'] = ieee2ibm(Data[:, i0:i1].T)
+        else:
+            block['data'] = Data[:, i0:i1].T
+        f.write(block.tobytes())
+
 
+# %%
+def getSegyTraceHeaderView(SH, keys=None, data='none', endian='>'):
+    """
+    view=getSegyTraceHeaderView(SH,keys,data,endian)
+    Structured (ntraces,) view of the trace headers, strided over the trace
+    blocks (240 + ns*bps bytes), with the STH_def fields in keys (default all).
+    The view is taken on data if given, else on a read-only np.memmap of
+    SH["filename"], so only the pages holding headers are read.
+    """
+    endian = SH.get("endian", endian)
     bps = getBytePerSample(SH)
+    ntraces = int(SH["ntraces"])
 
-    if (data == 'none'):
-        data = open(SH["filename"]).read()
+    # 240 bytes records strided over the trace blocks
+    dtype = STH_LAYOUT.dtype(endian, keys, 240)
+    stride = 240 + int(SH["ns"]) * bps
 
-    # SET PARAMETERS THAT DEFINE THE LOCATION OF THE LAST HEADER
-    # AND THE TRACE NUMBER KEY FIELD
-    THpos = STH_def[THN]["pos"]
-    THformat = STH_def[THN]["type"]
-    ntraces = SH["ntraces"]
+    if isinstance(data, str):
+        if ntraces <= 0:
+            return np.zeros(0, dtype=dtype)
+        data = np.memmap(SH["filename"], dtype=np.uint8, mode='r')
 
-    pos = THpos + 3600 + (SH["ns"] * bps + 240) * (ntraces - 1);
+    # the last trace may be short of samples, only its header has to be there
+    ntraces = min(ntraces, max(0, (len(data) - 3600 - 240) // stride + 1))
 
-    txt = "getLastSegyTraceHeader : Reading last trace header " + THN + " " + str(pos)
+    return np.ndarray(shape=(ntraces,), dtype=dtype, buffer=data, offset=3600, strides=(stride,))
 
-    #printverbose(txt, 20);
-    thv, index = getValue(data, pos, THformat, endian, 1)
-    txt = "getLastSegyTraceHeader : " + THN + "=" + str(thv)
-    #printverbose(txt, 30);
 
-    return thv
+# %%
+def getSegyTraceHeader(SH, THN='cdp', data='none', endian='>'):  # modified by A Squelch
+    """
+    getSegyTraceHeader(SH,TraceHeaderName)
+    """
+
+    view = getSegyTraceHeaderView(SH, [THN], data, endian)
+
+    return view[THN].astype(np.float64)
+
+
+# %%
+def getLastSegyTraceHeader(SH, THN='cdp', data='none', endian='>'):  # added by A Squelch
+    """
+    getLastSegyTraceHeader(SH,TraceHeaderName)
+    """
+
+    view = getSegyTraceHeaderView(SH, [THN], data, endian)
+
+    return view[THN][-1]
 
 
 # %%
 def getAllSegyTraceHeaders(SH, data='none'):
+    """
+    Read all trace header columns of STH_def in one strided pass.
+    """
     SegyTraceHeaders = {'filename': SH["filename"]}
 
-    #printverbose('getAllSegyTraceHeaders : trying to get all segy trace headers', 2)
-
-    if (data == 'none'):
-        data = open(SH["filename"], 'rb').read()
+    view = getSegyTraceHeaderView(SH, None, data)
 
-    for key in STH_def.keys():
-        sth = getSegyTraceHeader(SH, key, data)
-        SegyTraceHeaders[key] = sth
-        txt = "getAllSegyTraceHeaders :  " + key
-        #printverbose(txt, 10)
+    for key in STH_LAYOUT.names:
+        SegyTraceHeaders[key] = view[key].astype(np.float64)
 
     return SegyTraceHeaders
 
 
 # %%
-def readSegy(filename, endian='>', rev = None, dsf = None):  
+def readSegy(filename, endian='>', rev = None, dsf = None, mmap = False):  
     """
     Data,SegyHeader,SegyTraceHeaders=getSegyHeader(filename)
+
+    With mmap=True the file is not read: Data is a (ns, ntraces) view and each
+    trace header column a strided view on a copy-on-write np.memmap of the file,
+    paged in on demand.
+    IBM float data (DSF=1) is the exception: its samples are decoded in memory.
     """
 
     Data = None
     SH = None
     SegyTraceHeaders = None
 
+    if mmap:
+
+        SH = getSegyHeader(filename, endian, rev, dsf)
+        traces = mapSegyTraces(SH)
+
+        SH["ntraces"] = len(traces)
+
+        if SH["DataSampleFormat"] == 1:
+            # IBM floats cannot be viewed as IEEE, they are decoded in memory
+            Data = ibm2ieee(traces['data']).T
+        else:
+            Data = traces['data'].T
+        SegyTraceHeaders = {}
+        for key in STH_LAYOUT.names:
+            SegyTraceHeaders[key] = traces['header'][key]
+
+        return Data, SH, SegyTraceHeaders
+
     #printverbose("readSegy : Trying to read " + filename, 0)
 
     fs = open(filename, 'rb')
@@ -777,6 +951,7 @@ def readSegy(filename, endian='>', rev = None, dsf = None):
     filesize = len(data)
 
     SH = getSegyHeader(filename, endian, rev, dsf)  
+    endian = SH["endian"]
 
     bps = getBytePerSample(SH)
 
@@ -813,6 +988,59 @@ def readSegy(filename, endian='>', rev = None, dsf = None):
     return Data, SH, SegyTraceHeaders
 
 
+# %%
+def getSampleDtype(SH):
+    """
+    dtype=getSampleDtype(SH)
+    Big endian numpy dtype of the samples for the DataSampleFormat of SH.
+    """
+    dsf = SH["DataSampleFormat"]
+
+    if (dsf == 1):
+        return NUMPY_DTYPES['ibm']
+    elif (dsf == 2):
+        return NUMPY_DTYPES['int32']
+    elif (dsf == 3):
+        return NUMPY_DTYPES['int16']
+    elif (dsf == 5):
+        return NUMPY_DTYPES['float32']
+    elif (dsf == 8):
+        return NUMPY_DTYPES['int8']
+    else:
+        raise ValueError("DSF=" + str(dsf) + ", NOT SUPORTED")
+
+
+# %%
+def getSegyTraceDtype(SH, endian='>'):
+    """
+    dtype=getSegyTraceDtype(SH,endian)
+    Structured numpy dtype of one trace block: 240 bytes header followed by ns samples.
+    """
+    sample_dtype = getSampleDtype(SH)
+
+    return np.dtype([('header', STH_LAYOUT.dtype(endian)),
+                     ('data', sample_dtype.newbyteorder(endian), (int(SH['ns']),))])
+
+
+# %%
+def mapSegyTraces(SH, endian='>', mode='c'):
+    """
+    traces=mapSegyTraces(SH,endian,mode)
+    Memory-map the traces of the file SH["filename"] as a structured array of
+    (header, data) records, one per trace. Nothing is read until accessed.
+    The default mode 'c' is copy-on-write: assignments never reach the file.
+    """
+    dtype = getSegyTraceDtype(SH, SH.get("endian", endian))
+
+    filesize = os.path.getsize(SH["filename"])
+    ntraces = (filesize - 3600) // dtype.itemsize
+
+    if ntraces <= 0:
+        return np.zeros(0, dtype=dtype)
+
+    return np.memmap(SH["filename"], dtype=dtype, mode=mode, offset=3600, shape=(ntraces,))
+
+
 
 
 def make_dtype(data_sample_format): # TODO: What is the correct name for this arg?
@@ -823,7 +1051,8 @@ def make_dtype(data_sample_format): # TODO: What is the correct name for this ar
 
     Note :
 
-        IBM float data sample formats ('ibm') will correspond to IEEE float data types.
+        IBM float data sample formats ('ibm') correspond to raw uint32 words,
+        to be decoded with ibm2ieee.
 
 
 
@@ -857,10 +1086,8 @@ def parseDataBuffer(fs, dsf = 'float32', endian = '>'):
 
     fs.seek(0)
 
-    TRACES_TRACE_TYPE =  NUMPY_DTYPES[dsf]
-    
-    TRACES_TRACE_TYPE.newbyteorder(endian)
-    TRACES_HEADER_TYPE.newbyteorder(endian)
+    TRACES_TRACE_TYPE = NUMPY_DTYPES[dsf].newbyteorder(endian)
+    TRACES_HEADER_TYPE = STH_LAYOUT.dtype(endian)
 
     TRACES_HEADER_BYTES = TRACES_HEADER_TYPE.itemsize
     TRACES_TRACE_BYTES = TRACES_TRACE_TYPE.itemsize
@@ -876,7 +1103,7 @@ def parseDataBuffer(fs, dsf = 'float32', endian = '>'):
         l=fs.read(TRACES_HEADER_BYTES)
         if len(l) == TRACES_HEADER_BYTES:
             rec=np.frombuffer(l, TRACES_HEADER_TYPE)
-            ns=rec['ns'][0]
+            ns=int(rec['ns'][0])
             #print(ns)
             trcstr=fs.read(ns *TRACES_TRACE_BYTES )
             headers.append(rec)
@@ -891,6 +1118,9 @@ def parseDataBuffer(fs, dsf = 'float32', endian = '>'):
     headers=np.stack(headers).reshape(-1)
     traces=np.stack(traces, axis = 1)
 
+    if dsf == 'ibm':
+        traces = ibm2ieee(traces)
+
     if dsf == 'int8':
     
         for i in range(ns):
@@ -922,6 +1152,8 @@ def loadSegyData(data, SH, bps, endian='>'):  # added by A Squelch
         revision = 1
     if (revision == 256):  # added by A Squelch
         revision = 1
+    if (revision == SEGY_REV2):  # same sample formats as rev1 for DSF 1-8
+        revision = 1
 
     dsf = SH["DataSampleFormat"]
 
@@ -943,7 +1175,7 @@ def loadSegyData(data, SH, bps, endian='>'):  # added by A Squelch
         print("loadSegyData : DSF=" + str(SH["DataSampleFormat"]) + ", NOT SUPORTED", 2)
 
     STH = {}
-    for key in TRACES_HEADER_TYPE.names:       
+    for key in STH_LAYOUT.names:
 
         STH[key] = HD[key]
 
@@ -975,6 +1207,8 @@ def readSegyData(data, SH, nd, bps, index, endian='>'):  # added by A Squelch
         revision = 1
     if (revision == 256):  # added by A Squelch
         revision = 1
+    if (revision == SEGY_REV2):  # same sample formats as rev1 for DSF 1-8
+        revision = 1
 
     dsf = SH["DataSampleFormat"]
 
@@ -1064,36 +1298,31 @@ def getSegyTrace(SH, itrace, endian='>'):  # modified by A Squelch
 def getSegyHeader(filename, endian='>', rev = None, dsf = None):  # modified by A Squelch
     """
     SegyHeader=getSegyHeader(filename)
+    SegyHeader["endian"] is the byte order of the file: endian, or the other
+    one if the rev2 byte order marker says so. Functions taking SegyHeader
+    use it instead of their endian argument.
     """
 
-    data = open(filename, 'rb').read()
+    with open(filename, 'rb') as f:
+        data = f.read(3600)
 
     SegyHeader = {'filename': filename}
 
-    if rev != None:
-        SegyHeader["SegyFormatRevisionNumber"] = rev
-    
-
-    j = 0
-    for key in SH_def.keys():
-        j = j + 1
-        pos = SH_def[key]["pos"]
-        format = SH_def[key]["type"]
-
-        txt = "i=%3d, pos=%5d, format=%2s, key=%s" % (j, pos, format, key)
+    SegyHeader.update(SH_LAYOUT.unpack(data[SEGY_ASCII_REEL_HEADER_BYTES:], endian))
 
+    # a rev2 byte order marker read swapped means the file has the other byte order
+    if SegyHeader["ByteOrderMarker"] == int.from_bytes(SEGY_BYTE_ORDER_MARKER.to_bytes(4, 'little'), 'big'):
+        endian = '<' if endian == '>' else '>'
+        SegyHeader.update(SH_LAYOUT.unpack(data[SEGY_ASCII_REEL_HEADER_BYTES:], endian))
 
-        SegyHeader[key], index = getValue(data, pos, format, endian)
-
-        txt = "SegyHeader[%s] = %f" % (key, SegyHeader[key])
-        #printverbose(txt, 2)
+    SegyHeader["endian"] = endian
 
     if dsf != None:
         SegyHeader["DataSampleFormat"] = dsf    
     # SET NUMBER OF BYTES PER DATA SAMPLE
     bps = getBytePerSample(SegyHeader)
 
-    filesize = len(data)
+    filesize = os.path.getsize(filename)
     ntraces = (filesize - 3600) / (SegyHeader['ns'] * bps + 240)
     SegyHeader["ntraces"] = ntraces
     SegyHeader["time"]=np.arange(SegyHeader['ns']) * SegyHeader['dt'] / 1e+6
@@ -1140,187 +1369,356 @@ def writeSegy(filename, Data, dt=1000, STHin={}, SHin={}):
 def writeSegyStructure(filename, Data, SH, STH, endian='>'):  # modified by A Squelch
     """
     writeSegyStructure(filename,Data,SegyHeader,SegyTraceHeaders)
-    Write SEGY file using SEG-Y data structures
+    Write SEGY file using SEG-Y data structures, samples in the
+    DataSampleFormat of SH
     See also readSegy
     
     """
 
     #printverbose("writeSegyStructure : Trying to write " + filename, 0)
 
-    f = open(filename, 'wb')
+    with open(filename, 'wb') as f:
 
-    # VERBOSE INF
-    revision = SH["SegyFormatRevisionNumber"]
-    dsf = SH["DataSampleFormat"]
-    if (revision == 100):
-        revision = 1
-    if (revision == 256):  # added by A Squelch
-        revision = 1
+        f.write(packSegyHeader(SH, endian))
 
-    # try:  # block added by A Squelch
-    #     DataDescr = SH_def["DataSampleFormat"]["descr"][str(revision)][str(dsf)]
-    # except KeyError:
-    #     print("")
-    #     print("  An error has ocurred interpreting a SEGY binary header key")
-    #     print("  Please check the Endian setting for this file: ", SH["filename"])
-    #     sys.exit()
+        writeSegyTraces(f, Data, STH, int(SH['ns']), int(SH['ntraces']), getSampleDtype(SH), endian,
+                        ibm=SH["DataSampleFormat"] == 1)
 
-    #printverbose("writeSegyStructure : SEG-Y revision = " + str(revision), 1)
-    #printverbose("writeSegyStructure : DataSampleFormat=" + str(dsf) + "(" + DataDescr + ")", 1)
+    # return segybuffer
 
-    # WRITE SEGY HEADER
+def convert2Segy(filename, Data, SH, STH, endian='>'):  # modified by A Squelch
+    """
+    writeSegyStructure(filename,Data,SegyHeader,SegyTraceHeaders)
+    Write SEGY file using SEG-Y data structures
+    See also readSegy
+      
+    """
 
-    for key in SH_def.keys():
-        pos = SH_def[key]["pos"]
-        format = SH_def[key]["type"]
-        value = SH[key]
+    writeSegyStructure(filename, Data, SH, STH, endian)
 
-        #        SegyHeader[key],index = putValue(value,f,pos,format,endian);
-        putValue(value, f, pos, format, endian)
 
-        txt = str(pos) + " " + str(format) + "  Reading " + key + "=" + str(value)
-    # +"="+str(SegyHeader[key])
-    # printverbose(txt,-1)
+class SegyWriter:
+    """
+    Incremental SEG-Y writer, so that long gathers never have to be held in memory:
+
+        with SegyWriter(filename, SH) as w:
+            for Data, STH in blocks:
+                w.append(Data, STH)
+
+    The binary header is written when the file is opened; samples are encoded in
+    the DataSampleFormat of SH, little endian files are marked as rev2 (see
+    setSegyFormat). Each append() takes a (ns, ntr) block and a dict
+    (or structured array) of ntr trace header rows; without headers, default ones
+    are made with the trace sequence numbers continuing over the file. On close,
+    SH["ntraces"] is set to the number of traces written and the binary header
+    is written again so that fields updated meanwhile reach the file.
+    """
 
-    # SEGY TRACES
+    def __init__(self, filename, SH, endian='>'):
 
-    ctype = SH_def['DataSampleFormat']['datatype'][revision][dsf]
-    bps = SH_def['DataSampleFormat']['bps'][revision][dsf]
+        self.filename = filename
+        self.SH = SH
+        self.endian = endian
 
-    sizeT = 240 + SH['ns'] * bps
+        if endian == '<':
+            setSegyFormat(SH, SH['DataSampleFormat'], endian)
 
-    for itrace in range(SH['ntraces']):
-        index = 3600 + itrace * sizeT
-        #printverbose('Writing Trace #' + str(itrace + 1) + '/' + str(SH['ntraces']), 10)
-        # WRITE SEGY TRACE HEADER
-        for key in STH_def.keys():
-            pos = index + STH_def[key]["pos"]
-            format = STH_def[key]["type"]
-            value = STH[key][itrace]
-            txt = str(pos) + " " + str(format) + "  Writing " + key + "=" + str(value)
+        self.ns = int(SH['ns'])
+        self.sample_dtype = getSampleDtype(SH)
+        self.ibm = SH['DataSampleFormat'] == 1
+        self.ntraces = 0
 
-            #printverbose(txt, 40)
-            putValue(value, f, pos, format, endian)
+        self.f = open(filename, 'wb')
+        self.f.write(packSegyHeader(SH, endian))
 
-            # Write Data
-        cformat = endian + ctype
-        for s in range(SH['ns']):
-            strVal = struct.pack(cformat, Data[s, itrace])
-            f.seek(index + 240 + s * struct.calcsize(cformat))
-            f.write(strVal)
+    def __enter__(self):
+        return self
 
-    f.close
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-    # return segybuffer
+    def append(self, Data, STH=None):
+        """
+        Write a (ns, ntr) block of traces, or a single trace of ns samples.
+        """
+        Data = np.asarray(Data)
+        if Data.ndim == 1:
+            Data = Data.reshape(-1, 1)
 
-def convert2Segy(filename, Data, SH, STH, endian='>'):  # modified by A Squelch
+        if Data.shape[0] != self.ns:
+            raise ValueError("SegyWriter.append : traces have " + str(Data.shape[0]) +
+                             " samples, the file has ns=" + str(self.ns))
+
+        ntr = Data.shape[1]
+
+        if STH is None:
+            STH = getDefaultSegyTraceHeaders(ntr, self.ns, self.SH['dt'])
+            for key in ['TraceSequenceLine', 'TraceSequenceFile', 'TraceNumber']:
+                STH[key] = STH[key] + self.ntraces
+
+        writeSegyTraces(self.f, Data, STH, self.ns, ntr, self.sample_dtype, self.endian, ibm=self.ibm)
+
+        self.ntraces += ntr
+
+    def close(self):
+
+        if self.f is None:
+            return
+
+        self.SH['ntraces'] = self.ntraces
+
+        self.f.seek(SEGY_ASCII_REEL_HEADER_BYTES)
+        self.f.write(packSegyHeader(self.SH, self.endian)[SEGY_ASCII_REEL_HEADER_BYTES:])
+
+        self.f.close()
+        self.f = None
+
+
+def mergeSegy(filename, filelist, endian='>', chunk_bytes=2**26):
     """
-    writeSegyStructure(filename,Data,SegyHeader,SegyTraceHeaders)
-    Write SEGY file using SEG-Y data structures
-    See also readSegy
-      
+    ntraces=mergeSegy(filename,filelist)
+    Concatenate the traces of the SEG-Y files of filelist into filename.
+    Files whose ns, dt, DataSampleFormat or byte order differ from the first
+    one are skipped.
+    Trace blocks are copied as they are, read and written in buffers of about
+    chunk_bytes; only TraceSequenceLine, TraceSequenceFile and TraceNumber are
+    rewritten to run over the merged file. The textual and binary headers are
+    those of the first file. Returns the number of traces written.
     """
+    keys = ['TraceSequenceLine', 'TraceSequenceFile', 'TraceNumber']
 
-    #printverbose("writeSegyStructure : Trying to write " + filename, 0)
+    f = None
+    ntraces = 0
 
-    f = open(filename, 'wb')
+    try:
 
-    # VERBOSE INF
-    revision = SH["SegyFormatRevisionNumber"]
-    dsf = SH["DataSampleFormat"]
-    if (revision == 100):
-        revision = 1
-    if (revision == 256):  # added by A Squelch
-        revision = 1
+        for i, path in enumerate(filelist):
 
-   
+            if not os.path.isfile(path):
+                continue
 
-    # WRITE SEGY Texual File HEADER (3200 bytes)
-    # f.seek(0)
-    # import ebcdic
-    # f.write(TFH.encode('cp1141'))
+            fSH = getSegyHeader(path, endian)
+            bps = getBytePerSample(fSH)
+            size = 240 + int(fSH['ns']) * bps
 
-    # WRITE SEGY HEADER
+            if f is None:
 
-    for key in SH_def.keys():
-        pos = SH_def[key]["pos"]
-        format = SH_def[key]["type"]
-        value = SH[key]
+                SH = fSH
+                f = open(filename, 'wb')
 
-        #        SegyHeader[key],index = putValue(value,f,pos,format,endian);
-        putValue(value, f, pos, format, endian)
+                with open(path, 'rb') as fs:
+                    f.write(fs.read(3600))
 
-        txt = str(pos) + " " + str(format) + "  Reading " + key + "=" + str(value)
-    
+                # sequence fields, strided over the trace blocks
+                dtype = STH_LAYOUT.dtype(SH["endian"], keys, size)
+                step = max(1, int(chunk_bytes // size))
+                buf = bytearray(step * size)
 
-    # SEGY TRACES
+            elif any(fSH[key] != SH[key] for key in ['ns', 'dt', 'DataSampleFormat', 'endian']):
 
-    ctype = SH_def['DataSampleFormat']['datatype'][revision][dsf]
-    bps = SH_def['DataSampleFormat']['bps'][revision][dsf]
+                print("Error: ns, dt, data sample format or byte order of " + str(i) + " differ from the first file!\n" + path + " was skipped in this merging process.")
+                continue
 
-    sizeT = 240 + SH['ns'] * bps
+            ntr = (os.path.getsize(path) - 3600) // size
 
-    for itrace in range(SH['ntraces']):
-        index = 3600 + itrace * sizeT
-        #printverbose('Writing Trace #' + str(itrace + 1) + '/' + str(SH['ntraces']), 10)
-        # WRITE SEGY TRACE HEADER
-        for key in STH_def.keys():
-            pos = index + STH_def[key]["pos"]
-            format = STH_def[key]["type"]
-            value = STH[key][itrace]
-            txt = str(pos) + " " + str(format) + "  Writing " + key + "=" + str(value)
+            with open(path, 'rb') as fs:
 
-            #printverbose(txt, 40)
-            putValue(value, f, pos, format, endian)
+                fs.seek(3600)
+
+                for i0 in range(0, ntr, step):
 
-            # Write Data
-        cformat = endian + ctype
-        for s in range(SH['ns']):
-            strVal = struct.pack(cformat, Data[s, itrace])
-            f.seek(index + 240 + s * struct.calcsize(cformat))
-            f.write(strVal)
+                    n = min(step, ntr - i0)
+                    block = memoryview(buf)[:n * size]
+                    nbytes = fs.readinto(block)
 
-    f.close
+                    # a file truncated since its size was taken ends at its last
+                    # complete trace, the rest of buf holding the previous block
+                    short = nbytes < len(block)
+                    if short:
+                        print("Error: " + path + " was truncated while merging, only its complete traces were merged.")
+                        n = nbytes // size
+                        block = block[:n * size]
 
-def mergeSegy(filename, filelist):
+                    seq = np.arange(ntraces + 1, ntraces + n + 1)
+                    headers = np.ndarray(shape=(n,), dtype=dtype, buffer=block)
+                    for key in keys:
+                        headers[key] = seq
 
+                    f.write(block)
+                    ntraces += n
+
+                    if short:
+                        break
+
+    finally:
+
+        if f is not None:
+            f.close()
+
+    return ntraces
+
+
+# %%
+def headerTimes(year, day, hour, minute, second):
+    """
+    times=headerTimes(year,day,hour,minute,second)
+    datetime64[s] start times from trace header date and time columns.
+    """
+    year = np.asarray(year, dtype=np.int64)
+    days = (year - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+    days = days + (np.asarray(day, dtype=np.int64) - 1).astype('timedelta64[D]')
+
+    seconds = np.asarray(hour, dtype=np.int64) * 3600 + np.asarray(minute, dtype=np.int64) * 60 \
+        + np.asarray(second, dtype=np.int64)
+
+    return days.astype('datetime64[s]') + seconds.astype('timedelta64[s]')
+
+
+# %%
+def getSegyTraceTimes(SH, endian='>'):
+    """
+    times=getSegyTraceTimes(SH)
+    datetime64[s] start time of every trace of the file SH["filename"].
+    """
+    keys = ['YearDataRecorded', 'DayOfYear', 'HourOfDay', 'MinuteOfHour', 'SecondOfMinute']
+    view = getSegyTraceHeaderView(SH, keys, endian=endian)
+
+    return headerTimes(*[view[key] for key in keys])
+
+
+CONTINUOUS_PERIODS = {'hour': 3600, 'day': 86400}
+
+
+def mergeSegyContinuous(outpath, filelist, period='hour', fill=0, endian='>'):
+    """
+    outfiles=mergeSegyContinuous(outpath,filelist,period,fill)
+    Join the SEG-Y files of filelist along time into one continuous record
+    per hour or day (period), one trace per receiver (Inline3D) and
+    TraceIdentificationCode. Trace start times come from the trace headers.
+
+    Such records exceed the 65535 samples of a SEG-Y trace, so each one is a
+    numpy .npy file of shape (ntraces, ns), preallocated on disk and filled
+    trace by trace from memory-mapped inputs: at most one trace of one input
+    is in memory. Samples no input covers are set to fill. Next to each
+    YYYYMMDD_HHMMSS.npy a .json file holds the start time, dt, the receiver
+    and code of every trace, the input files and the gaps as sample ranges
+    [start, end) per trace; see loadContinuous.
+    Files whose dt or DataSampleFormat differ from the first one are skipped.
+    """
+    if period not in CONTINUOUS_PERIODS:
+        raise ValueError("period must be one of " + str(list(CONTINUOUS_PERIODS)))
+    seconds = CONTINUOUS_PERIODS[period]
+
+    # header pass: times, receivers and codes of every input
+    inputs = []
     for i, path in enumerate(filelist):
-        
-        if os.path.isfile(path):
-            
-            Data,SegyHeader,SegyTraceHeaders = readSegy(path)
 
-  
-            if i == 0:
+        if not os.path.isfile(path):
+            continue
 
-                ss1 = Data.shape
-                D = Data
-                SH = SegyHeader
-                STH = SegyTraceHeaders
+        fSH = getSegyHeader(path, endian)
 
-            else:
+        if inputs and any(fSH[key] != inputs[0][1][key] for key in ['dt', 'DataSampleFormat']):
+            print("Error: dt or data sample format of " + str(i) + " differ from the first file!\n" + path + " was skipped in this merging process.")
+            continue
 
-                ss = Data.shape
+        view = getSegyTraceHeaderView(fSH, ['Inline3D', 'TraceIdentificationCode'], endian=endian)
+        inputs.append((path, fSH, getSegyTraceTimes(fSH, endian),
+                       np.array(view['Inline3D']), np.array(view['TraceIdentificationCode'])))
 
-                if ss != ss1:
+    if not inputs:
+        return []
 
-                    print("Error: data size of " + str(i) + " differ from " + str(i-1) + "!\n" + path + " was skipped in this merging process.")
+    dt = int(inputs[0][1]['dt'])
+    ns = seconds * 1000000 // dt
+    ibm = inputs[0][1]['DataSampleFormat'] == 1
+    dtype = np.dtype(np.float32) if ibm else getSampleDtype(inputs[0][1]).newbyteorder('=')
 
-                else:
+    # inputs overlapping each period
+    groups = {}
+    for k, (path, fSH, times, rcv, code) in enumerate(inputs):
+        p = int(times.min().astype(np.int64)) // seconds * seconds
+        end = int(times.max().astype(np.int64)) * 1000000 + int(fSH['ns']) * dt
+        while p * 1000000 < end:
+            groups.setdefault(p, []).append(k)
+            p += seconds
 
-                    j = len(SegyTraceHeaders['TraceNumber']) * i
-                    STH['TraceNumber'] = np.append(STH['TraceNumber'], [j+1, j+2, j+3])
-                    for key in STH.keys():  
-                        if key != 'TraceNumber':    
-                            STH[key] = np.append(STH[key], SegyTraceHeaders[key])                        
-                    
-                    D = np.append(D,Data, axis = 1)  
+    os.makedirs(outpath, exist_ok=True)
+    outfiles = []
 
-           
-    SH['ntraces'] = len(STH['TraceNumber'])
-    writeSegyStructure(filename, D, SH, STH) 
-        
+    for p in sorted(groups):
+
+        start = np.datetime64(p, 's')
+        name = os.path.join(outpath, start.astype(datetime.datetime).strftime('%Y%m%d_%H%M%S'))
+
+        # one trace per receiver and code, by receiver then order of appearance
+        pairs = {}
+        for k in groups[p]:
+            for pair in zip(inputs[k][3].tolist(), inputs[k][4].tolist()):
+                pairs.setdefault(pair, len(pairs))
+        pairs = sorted(pairs, key=lambda pair: (pair[0], pairs[pair]))
+        column = {pair: j for j, pair in enumerate(pairs)}
 
+        covered = [[] for pair in pairs]
+
+        part = name + '.part.npy'
+        out = np.lib.format.open_memmap(part, mode='w+', dtype=dtype, shape=(len(pairs), ns))
+        if fill != 0:
+            out[:] = fill
+
+        for k in groups[p]:
+
+            path, fSH, times, rcv, code = inputs[k]
+            traces = mapSegyTraces(fSH, endian, mode='r')
+            offsets = (times - start).astype(np.int64) * 1000000 // dt
+
+            for i in range(len(traces)):
+                j = column[(int(rcv[i]), int(code[i]))]
+                o = int(offsets[i])
+                a = max(0, -o)
+                b = min(int(fSH['ns']), ns - o)
+                if b <= a:
+                    continue
+                samples = traces['data'][i, a:b]
+                out[j, o + a:o + b] = ibm2ieee(samples) if ibm else samples
+                covered[j].append((o + a, o + b))
+
+        out.flush()
+        del out
+        os.replace(part, name + '.npy')
+
+        gaps = []
+        for j, intervals in enumerate(covered):
+            end = 0
+            for a, b in sorted(intervals) + [(ns, ns)]:
+                if a > end:
+                    gaps.append({'trace': j, 'rcv': pairs[j][0], 'code': pairs[j][1], 'start': end, 'end': a})
+                end = max(end, b)
+
+        meta = {'start': str(start), 'dt': dt, 'ns': ns, 'fill': fill,
+                'DataSampleFormat': int(inputs[0][1]['DataSampleFormat']),
+                'rcv': [pair[0] for pair in pairs], 'code': [pair[1] for pair in pairs],
+                'files': [inputs[k][0] for k in groups[p]], 'gaps': gaps}
+
+        with open(name + '.json', 'w') as f:
+            json.dump(meta, f, indent=1)
+
+        outfiles.append(name + '.npy')
+
+    return outfiles
+
+
+# %%
+def loadContinuous(filename):
+    """
+    Data,meta=loadContinuous(filename)
+    Memory-mapped (ns, ntraces) view of a record written by mergeSegyContinuous
+    and its metadata (see there).
+    """
+    with open(os.path.splitext(filename)[0] + '.json', 'r') as f:
+        meta = json.load(f)
+
+    return np.load(filename, mmap_mode='r').T, meta
 
 
 # %%
@@ -1407,13 +1805,9 @@ def getValue(data, index, ctype='l', endian='>', number=1):
     #printverbose("index, index_end = " + str(index) + "," + str(index_end), 9)
 
     if (ctype == 'ibm'):
-        # ASSUME IBM FLOAT DATA
-        Value = list(range(int(number)))
-        for i in np.arange(number):
-            index_ibm_start = i * 4 + index
-            index_ibm_end = index_ibm_start + 4
-            ibm_val = ibm2ieee2(data[index_ibm_start:index_ibm_end])
-            Value[i] = ibm_val
+        # ASSUME IBM FLOAT DATA, decoded in one vectorized pass
+        words = np.frombuffer(data, dtype=np.dtype('u4').newbyteorder(endian), count=int(number), offset=index)
+        Value = ibm2ieee(words).tolist()
         # this resturn an array as opposed to a tuple    
     else:
         # ALL OTHER TYPES OF DATA
@@ -1454,17 +1848,65 @@ def printverbose(txt, level=1):
 def ibm2Ieee(ibm_float):
     """
     ibm2Ieee(ibm_float)
-    Used by permission
-    (C) Secchi Angelo
-    with thanks to Howard Lightstone and Anton Vredegoor. 
+    Convert one big endian 4 bytes IBM float to a Python float
+    """
+    return float(ibm2ieee(np.frombuffer(ibm_float, dtype='>u4', count=1))[0])
+
+
+def ibm2ieee(ibm):
+    """
+    ieee=ibm2ieee(ibm)
+    Convert an array of IBM float words (uint32, any byte order) to float32.
+    Values outside the float32 range become +-inf or 0.
+    """
+    ibm = np.asarray(ibm).astype(np.uint32)
+
+    sign = np.where(ibm >> 31, -1.0, 1.0)
+    exponent = ((ibm >> 24) & 0x7f).astype(np.int32)
+    mantissa = (ibm & 0x00ffffff).astype(np.float64)
+
+    # value = mantissa/2**24 * 16**(exponent-64)
+    with np.errstate(over='ignore'):
+        ieee = (sign * np.ldexp(mantissa, 4 * (exponent - 64) - 24)).astype(np.float32)
+
+    return ieee
+
+
+def ieee2ibm(ieee):
     """
-    """    
-    I = struct.unpack('>I',ibm_float)[0]
-    sign = [1,-1][bool(i & 0x100000000L)]
-    characteristic = ((i >> 24) & 0x7f) - 64
-    fraction = (i & 0xffffff)/float(0x1000000L)
-    return sign*16**characteristic*fraction
+    ibm=ieee2ibm(ieee)
+    Convert an array of floats to IBM float words (native uint32), with the
+    mantissa rounded to nearest. Values beyond the IBM range saturate,
+    values below it become 0, and so do NaNs (IBM floats have none).
     """
+    ieee = np.asarray(ieee, dtype=np.float64)
+
+    ieee = np.where(np.isnan(ieee), 0.0, ieee)
+
+    sign = np.signbit(ieee).astype(np.uint32) << 31
+    a = np.abs(ieee)
+    inf = np.isinf(a)
+
+    # a = m*2**e with 0.5 <= m < 1, and 16**e16 >= 2**e
+    m, e = np.frexp(np.where(inf, 0.0, a))
+    e16 = -(-e // 4)
+    mantissa = np.rint(np.ldexp(m, e - 4 * e16 + 24)).astype(np.int64)
+
+    # rounding up to 1.0 renormalizes to the next hexadecimal exponent
+    carry = mantissa >= 0x1000000
+    mantissa = np.where(carry, mantissa >> 4, mantissa)
+    exponent = e16 + 64 + carry
+
+    overflow = (exponent > 127) | inf
+    underflow = (exponent < 0) | (a == 0)
+
+    mantissa = np.where(overflow, 0xffffff, np.where(underflow, 0, mantissa))
+    exponent = np.where(overflow, 127, np.where(underflow, 0, exponent))
+
+    ibm = sign | (exponent.astype(np.uint32) << 24) | mantissa.astype(np.uint32)
+    ibm = np.where(underflow, 0, ibm).astype(np.uint32)
+
+    return ibm
 
 
 def ibm2ieee2(ibm_float):
@@ -1497,6 +1939,8 @@ def getBytePerSample(SH):
         revision = 1
     if (revision == 256):  # added by A Squelch
         revision = 1
+    if (revision == SEGY_REV2):  # same sample formats as rev1 for DSF 1-8
+        revision = 1
 
 
     dsf = SH["DataSampleFormat"]
@@ -1613,37 +2057,88 @@ class Segy:
         self.traceData = data
         self.volumeHeader =  vheader
         self.traceHeader =  theader
-        self.zTraces = None
-        self.xTraces = None
-        self.yTraces = None
 
-        self.stats = {}
+        #self.fileName = fileName 
+
+        #plot
+        self.ax = None
 
-        self.df = None # unit is Hz
-        self.dt = None # unit is second
+        self._reset()
 
-        self.ns = None
-        self.ntr = None
+    def _reset(self):
 
-        #self.fileName = fileName 
+        # stats, component flag and component views are computed on first access
+        self._stats = None
+        self._componentFlag = None
+        self._components = None
 
-        self.componentFlag = int(3) # default is 1C
-        self.traceOrder = 'ZEN-ZEN-ZEN'
+    @property
+    def stats(self):
 
-        #plot
-        self.ax = None
-        
-        self._setStats()
-        self._setComponentData()
+        if self._stats is None:
+            self._stats = {}
+            self._setStats()
+
+        return self._stats
+
+    @property
+    def dt(self):
+        # unit is second
+        return self.stats['dt']
+
+    @property
+    def df(self):
+        # unit is Hz
+        return self.stats['df']
+
+    @property
+    def ns(self):
+        return self.stats['ns']
+
+    @property
+    def ntr(self):
+        return self.stats['ntr']
+
+    @property
+    def componentFlag(self):
+
+        if self._componentFlag is None:
+            self._setComponentFlag(self.traceHeader)
+
+        return self._componentFlag
+
+    @componentFlag.setter
+    def componentFlag(self, flag):
+
+        self._componentFlag = int(flag)
+        self._components = None
+
+    @property
+    def traceOrder(self):
+        return self._componentData()['order']
+
+    @property
+    def zTraces(self):
+        return self._componentData()['z']
+
+    @property
+    def xTraces(self):
+        return self._componentData()['x']
+
+    @property
+    def yTraces(self):
+        return self._componentData()['y']
 
     @classmethod
-    def fromSegyFile(cls, filename):
+    def fromSegyFile(cls, filename, mmap = False):
 
         """
         Return a Segy class by reading a SEG-Y file with .sgy as its suffix.
 
         :param filename: absulute file path of the SEG-Y file to be loaded.
         :type filename: str.
+        :param mmap: if True, trace data and headers are lazy copy-on-write views on a memory-mapped file.
+        :type mmap: bool.
                 
         :returns: a Segy class
         :rtype: class
@@ -1651,7 +2146,7 @@ class Segy:
         """  
         filename = transform_separator(filename)
 
-        traceData, volumeHeader, traceHeader =  readSegy(filename, endian = '>', rev = None, dsf = None)
+        traceData, volumeHeader, traceHeader =  readSegy(filename, endian = '>', rev = None, dsf = None, mmap = mmap)
 
         
         return cls(traceData, volumeHeader, traceHeader)
@@ -1679,6 +2174,27 @@ class Segy:
                 
         return cls(traceData, volumeHeader, traceHeader)
 
+    @classmethod
+    def fromContainerFile(cls, filename, mode = 'c'):
+
+        """
+        Return a Segy class by opening a memory-mappable trace container with .sgc as its suffix.
+
+        :param filename: absulute file path of the container to be opened.
+        :type filename: str.
+        :param mode: np.memmap mode of the trace data and headers, 'c' (copy-on-write), 'r' or 'r+'.
+        :type mode: str.
+                
+        :returns: a Segy class
+        :rtype: class
+            
+        """  
+        from .pscontainer import readContainer
+
+        traceData, volumeHeader, traceHeader = readContainer(transform_separator(filename), mode)
+
+        return cls(traceData, volumeHeader, traceHeader)
+
     def toDictFile(self, filename):
 
         """
@@ -1702,6 +2218,20 @@ class Segy:
         with open(filename, 'wb') as f:
             pickle.dump(dic, f)
 
+    def toContainerFile(self, filename):
+
+        """
+        Write the SEG-Y data contained in Segy class to a memory-mappable trace container with .sgc as its suffix.
+
+        :param filename: absulute file path of the container to be written down.
+        :type filename: str.
+                
+                    
+        """  
+        from .pscontainer import writeContainer
+
+        writeContainer(transform_separator(filename), self.traceData, self.volumeHeader, self.traceHeader)
+
     def toSegyFile_(self, filename,  endian='>'):  
         
         """
@@ -1784,95 +2314,38 @@ class Segy:
         f.close()
 
     
-    def toSegyFile(self, filename,  endian='>'):  
+    def toSegyFile(self, filename,  endian='>', dsf=5):  
         
         """
         
-        Write the SEG-Y data contained in Segy class to a standard Rev1 SEG-Y file with .sgy as its suffix.
+        Write the SEG-Y data contained in Segy class to a SEG-Y file with .sgy as its suffix.
 
         :param filename: absulute file path of the dict file to be written down.
         :type filename: str.
-        :param filename: endian setting for the file to be written down, with little endian as '<' and big endian as '>'.
-        :type filename: str.
+        :param endian: '>' for a big endian Rev1 file, '<' for a little endian Rev2 file with its byte order marker.
+        :type endian: str.
+        :param dsf: data sample format: 1 IBM float, 2 int32, 3 int16, 5 IEEE float (default), 8 int8.
+            Samples are cast to it, integer data of the same type is written as it is.
+            Samples out of the range of an integer format raise a ValueError.
+        :type dsf: int.
 
         """  
 
         Data = self.traceData
-        SH = self.volumeHeader
+        SH = setSegyFormat(dict(self.volumeHeader), dsf, endian)
         STH = self.traceHeader
 
-        f = open(filename, 'wb')
-
-       
-        # revision = SH["SegyFormatRevisionNumber"]
-        
-        revision = 1
-        dsf = 5
-        # if (revision == 100):
-        #     revision = 1
-        # if (revision == 256):  # added by A Squelch
-        #     revision = 1
-
-        
-
-    
-
-        # WRITE SEGY Texual File HEADER (3200 bytes)
-        f.seek(0)
-        # import ebcdic
-        # f.write(TFH.encode('cp1141'))
-
-        # WRITE SEGY HEADER
-
-        for key in SH_def.keys():
-            pos = SH_def[key]["pos"]
-            format = SH_def[key]["type"]
-            value = SH[key]
-
-            #        SegyHeader[key],index = putValue(value,f,pos,format,endian);
-            putValue(value, f, pos, format, endian)
-
-            txt = str(pos) + " " + str(format) + "  Reading " + key + "=" + str(value)
-        
-
-        # SEGY TRACES
-
-        ctype = SH_def['DataSampleFormat']['datatype'][revision][dsf]
-        bps = SH_def['DataSampleFormat']['bps'][revision][dsf]
-
-        sizeT = 240 + SH['ns'] * bps
-
-        for itrace in range(SH['ntraces']):
-            index = 3600 + itrace * sizeT
-            #printverbose('Writing Trace #' + str(itrace + 1) + '/' + str(SH['ntraces']), 10)
-            # WRITE SEGY TRACE HEADER
-            for key in STH_def.keys():
-                pos = index + STH_def[key]["pos"]
-                format = STH_def[key]["type"]
-                value = STH[key][itrace]
-                txt = str(pos) + " " + str(format) + "  Writing " + key + "=" + str(value)
+        # fail before creating the file rather than leave it half written
+        if dsf != 1:
+            checkSampleRange(Data, getSampleDtype(SH))
 
-                #printverbose(txt, 40)
-                putValue(value, f, pos, format, endian)
+        with open(filename, 'wb') as f:
 
-            # Write Data
-            
-            # method 1: using numpy tobytes, high speed
-            cformat = endian + ctype * SH['ns']
-            arr = Data[:, itrace].tolist()
-            #arr_bytes = arr.tobytes('C')
-            strVal = struct.pack(cformat, *arr)
-            f.seek(index + 240)
-            f.write(strVal)
-            
-            # # method 2: using struct.pack for each sample point, low speed      
-            # cformat = endian + ctype               
-            # for s in range(SH['ns']):
-            #     strVal = struct.pack(cformat, Data[s, itrace])
-            #     f.seek(index + 240 + s * struct.calcsize(cformat))
-            #     f.write(strVal)
+            # WRITE SEGY Texual File HEADER (3200 bytes, left empty) AND SEGY HEADER
+            f.write(packSegyHeader(SH, endian))
 
-        f.close()
+            # SEGY TRACES, headers and samples interleaved in large blocks
+            writeSegyTraces(f, Data, STH, SH['ns'], SH['ntraces'], getSampleDtype(SH), endian, ibm=dsf == 1)
 
     def setTraceData(self, data):
 
@@ -1886,6 +2359,7 @@ class Segy:
         """  
 
         self.traceData = data
+        self._reset()
 
     def setVolumeHeader(self, vheader):
 
@@ -1899,6 +2373,7 @@ class Segy:
         """  
 
         self.volumeHeader = vheader
+        self._reset()
 
     def setTraceHeader(self, theader):
 
@@ -1911,15 +2386,19 @@ class Segy:
 
         """  
         self.traceHeader = theader
+        self._reset()
 
     def _setStats(self):
     
         self._setSampleRate(self.volumeHeader)
-        self._setComponentFlag(self.traceHeader)
         self._setDateTime(self.traceHeader)
         self._setSampleNumber(self.volumeHeader)
         self._setTraceNumber(self.volumeHeader)
 
+        self.stats['com'] = self.componentFlag
+        if self.componentFlag == 3:
+            self.stats['order'] = self.traceOrder
+
     def _setDateTime(self, th):
 
         
@@ -1965,100 +2444,106 @@ class Segy:
         
 
         
-    def _setComponentData(self):
+    def _componentData(self):
+
+        """
+        Component views of the trace data, as strided slices of it. The missing
+        horizontal components of 1C data are read-only zeros taking no memory.
+        """
+
+        if self._components is not None:
+            return self._components
 
         ntr = self.stats['ntr']
         ns = self.stats['ns']
+        code = self.traceHeader['TraceIdentificationCode']
 
         if self.componentFlag == 3:
 
-            self.stats['com'] = 3
-        
-            if self.traceHeader['TraceIdentificationCode'][0] == 12.0 and (self.traceHeader['TraceIdentificationCode'][1] == 13.0 or self.traceHeader['TraceIdentificationCode'][1] == 14.0): 
-                self.zTraces = self.traceData[:,0:ntr:3] # indexing from first element to last element with increment(skipt) 3 
-                self.xTraces = self.traceData[:,1:ntr:3] 
-                self.yTraces = self.traceData[:,2:ntr:3]
-                self.traceOrder = 'ZEN-ZEN-ZEN'
-                self.stats['order'] = 'ZEN-ZEN-ZEN'
-            
-            elif self.traceHeader['TraceIdentificationCode'][2] == 12.0 and (self.traceHeader['TraceIdentificationCode'][0] == 13.0 or self.traceHeader['TraceIdentificationCode'][0] == 14.0):
-                self.xTraces = self.traceData[:,0:ntr:3] # indexing from first element to last element with increment(skipt) 3 
-                self.yTraces = self.traceData[:,1:ntr:3] 
-                self.zTraces = self.traceData[:,2:ntr:3]
-                self.traceOrder = 'ENZ-ENZ-ENZ' 
-                self.stats['order'] = 'ENZ-ENZ-ENZ' 
-            
+            if code[0] == 12.0 and (code[1] == 13.0 or code[1] == 14.0):
+                order = 'ZEN-ZEN-ZEN'
+                z, x, y = slice(0, ntr, 3), slice(1, ntr, 3), slice(2, ntr, 3)
+
+            elif code[2] == 12.0 and (code[0] == 13.0 or code[0] == 14.0):
+                order = 'ENZ-ENZ-ENZ'
+                x, y, z = slice(0, ntr, 3), slice(1, ntr, 3), slice(2, ntr, 3)
+
             else:
-                self.zTraces = self.traceData[:,0:int(ntr/3)] # indexing from first element to last element with increment(skipt) 3 
-                self.xTraces = self.traceData[:,int(ntr/3):int(2*ntr/3)] 
-                self.yTraces = self.traceData[:,int(2*ntr/3):ntr]
-                self.traceOrder = 'ZZZ-EEE-NNN'
-                self.stats['order'] = 'ZZZ-EEE-NNN'
+                order = 'ZZZ-EEE-NNN'
+                z, x, y = slice(0, int(ntr/3)), slice(int(ntr/3), int(2*ntr/3)), slice(int(2*ntr/3), ntr)
+
+            index = np.arange(ntr)
+
+            self._components = {'order': order,
+                                'z': self.traceData[:, z],
+                                'x': self.traceData[:, x],
+                                'y': self.traceData[:, y],
+                                'index': {'z': index[z], 'x': index[x], 'y': index[y]}}
+
         else:
 
-            self.stats['com'] = 1
-            self.zTraces = self.traceData
-            self.xTraces = np.zeros((ns, ntr), dtype = np.float32)
-            self.yTraces = np.zeros((ns, ntr), dtype = np.float32)
-            self.traceOrder = 'ZZZ' 
+            zeros = np.broadcast_to(np.float32(0), (ns, ntr))
+            index = np.arange(ntr)
+
+            self._components = {'order': 'ZZZ', 'z': self.traceData, 'x': zeros, 'y': zeros,
+                                'index': {'z': index, 'x': index, 'y': index}}
+
+        return self._components
 
     def getTraceOrder(self):
 
         return self.traceOrder
 
+    def getComponentTraceIndex(self, component = 'z'):
+
+        """
+        getComponentTraceIndex(component)
+        Trace indices in traceData of the columns of zTraces, xTraces or yTraces
+        (component 'z', 'x' or 'y'). For 1C data all three are the trace indices.
+        """
+
+        return self._componentData()['index'][component]
+
 
     def setTraceIdentificationCode(self, com, order):
 
-               
+        """
+        setTraceIdentificationCode(com, order)
+        Write the trace identification codes of the '3C' order 'ZEN-ZEN-ZEN',
+        'ENZ-ENZ-ENZ' or 'ZZZ-EEE-NNN', or of 1C data, to the trace headers.
+        """
+
         ntr = self.stats['ntr']
-        ns = self.stats['ns']
+        code = self.traceHeader['TraceIdentificationCode']
 
         if com == '3C':           
 
-            self.componentFlag = 3
-
-            
             if order == 'ZEN-ZEN-ZEN':
-                self.traceOrder = 'ZEN-ZEN-ZEN'
-                self.traceHeader['TraceIdentificationCode'][0:ntr:3][:] = 12.0
-                self.traceHeader['TraceIdentificationCode'][1:ntr:3][:] = 13.0
-                self.traceHeader['TraceIdentificationCode'][2:ntr:3][:] = 14.0
-                self.zTraces = self.traceData[:,0:ntr:3] # indexing from first element to last element with increment(skipt) 3 
-                self.xTraces = self.traceData[:,1:ntr:3] 
-                self.yTraces = self.traceData[:,2:ntr:3]
+                code[0:ntr:3] = 12.0
+                code[1:ntr:3] = 13.0
+                code[2:ntr:3] = 14.0
             
             elif order == 'ENZ-ENZ-ENZ':
-                self.traceOrder = 'ENZ-ENZ-ENZ'
-                self.traceHeader['TraceIdentificationCode'][0:ntr:3][:] = 13.0
-                self.traceHeader['TraceIdentificationCode'][1:ntr:3][:] = 14.0
-                self.traceHeader['TraceIdentificationCode'][2:ntr:3][:] = 12.0
-                self.xTraces = self.traceData[:,0:ntr:3] # indexing from first element to last element with increment(skipt) 3 
-                self.yTraces = self.traceData[:,1:ntr:3] 
-                self.zTraces = self.traceData[:,2:ntr:3]
+                code[0:ntr:3] = 13.0
+                code[1:ntr:3] = 14.0
+                code[2:ntr:3] = 12.0
             
             else:
-                
-                self.traceOrder = 'ZZZ-EEE-NNN'
-                self.traceHeader['TraceIdentificationCode'][0:int(ntr/3)][:] = 12.0
-                self.traceHeader['TraceIdentificationCode'][int(ntr/3):int(2*ntr/3)][:] = 13.0
-                self.traceHeader['TraceIdentificationCode'][int(2*ntr/3):ntr][:] = 14.0
-                self.zTraces = self.traceData[:,0:int(ntr/3)] # indexing from first element to last element with increment(skipt) 3 
-                self.xTraces = self.traceData[:,int(ntr/3):int(2*ntr/3)] 
-                self.yTraces = self.traceData[:,int(2*ntr/3):ntr]
+                code[0:int(ntr/3)] = 12.0
+                code[int(ntr/3):int(2*ntr/3)] = 13.0
+                code[int(2*ntr/3):ntr] = 14.0
 
+            flag = 3
 
         else:
 
-            self.componentFlag = 1
-
-            self.zTraces = self.traceData
-            self.xTraces = np.zeros((ns, ntr), dtype = np.float32)
-            self.yTraces = np.zeros((ns, ntr), dtype = np.float32)
-            self.traceOrder = 'ZZZ' 
-            self.traceHeader['TraceIdentificationCode'][:] = 1.0
+            code[:] = 1.0
 
+            flag = 1
 
-    
+        # the component views follow the new codes
+        self._reset()
+        self.componentFlag = flag
 
 
     def _setTraceNumber(self, vh ):
@@ -2066,16 +2551,14 @@ class Segy:
         vh: volume header
 
         '''
-        self.ntr = vh['ntraces']
-        self.stats['ntr'] = self.ntr
+        self.stats['ntr'] = vh['ntraces']
 
     def _setSampleNumber(self, vh ):
         '''
         vh: volume header
 
         '''
-        self.ns = vh['ns']
-        self.stats['ns'] = self.ns
+        self.stats['ns'] = vh['ns']
     
 
     def _setComponentFlag(self, th):
@@ -2085,13 +2568,13 @@ class Segy:
         '''
         # cdp = th['cdp']
         # inline3D = th['Inline3D']
-        code = th['TraceIdentificationCode']        
-        uniqueness = np.unique(code)        
+        code = np.asarray(th['TraceIdentificationCode'])
 
-        if  len(uniqueness) > 1:
-            self.componentFlag = int(3)
+        # several codes make 3C data, no need to sort them all to know
+        if len(code) and (code != code[0]).any():
+            self._componentFlag = int(3)
         else:
-            self.componentFlag = int(1)
+            self._componentFlag = int(1)
         
     def getComponentFlag(self):
 
@@ -2108,136 +2591,179 @@ class Segy:
 
         dt = vh['dt']  # unit is us
 
-        self.dt = dt*1e-6
-        self.df = 1.0/self.dt
+        self.stats['dt'] = dt*1e-6
+        self.stats['df'] = 1.0/self.stats['dt']
 
-        self.stats['dt'] = self.dt
-        self.stats['df'] = self.df
+    def normalized(self, traces, out = None):
 
-    def normalized(self, traces):
-    
-        arr = traces.copy()
-        arr = arr - arr.mean(axis=0)
-        arr = arr / np.abs(arr).max(axis=0)
+        """
+        normalized(traces, out)
+        Traces with their mean removed, divided by their maximum amplitude.
+        The result goes into out when given, a float array which may be traces
+        itself (float traces only).
+        """
 
-        return arr  
+        if out is not None and not np.issubdtype(out.dtype, np.floating):
+            raise ValueError("Normalized traces need a float out array, not " + str(out.dtype))
 
-    def normed(self, Data):
-        
-        dim = Data.ndim
+        if out is None:
+            out = np.array(traces, dtype = np.result_type(traces, np.float32))
+
+        elif out is not traces:
+            out[...] = traces
+
+        out -= out.mean(axis=0)
+        out /= np.abs(out).max(axis=0)
+
+        return out
+
+    def normed(self, Data, out = None):
+
+        """
+        normed(Data, out)
+        float32 traces divided by their maximum absolute value, all traces at once.
+        The result goes into out when given, a float array which may be Data
+        itself (float traces only).
+        """
 
-        if dim == 1:
+        if out is not None and not np.issubdtype(out.dtype, np.floating):
+            raise ValueError("Normalized traces need a float out array, not " + str(out.dtype))
+
+        if Data.ndim == 1:
             Data = Data.reshape(len(Data), 1)
-        
-        (ns, nt) = Data.shape
-        # find max of each trace to normalization
-        normed = np.empty((ns, nt), dtype='float32')
-        maxval = 0.0
-        
-        for i in range(0, nt, 1):
-            trace = np.array(Data[:, i])
-            
-            if trace.max() > abs(trace.min()):
-                maxval = trace.max()
-            else:
-                maxval = abs(trace.min())
-                
-            normed[:,i] = trace/(maxval - np.finfo(float).eps)     
-        
-        return normed 
+            if out is not None:
+                out = out.reshape(len(out), 1)
 
-    def resampledTraces(self, Data, src_fs, tar_fs):
-        dim = Data.ndim
+        if out is None:
+            out = np.empty(Data.shape, dtype='float32')
+
+        # max of each trace to normalization
+        maxval = np.abs(Data).max(axis=0)
+
+        np.divide(Data, maxval - np.finfo(float).eps, out = out)
+
+        return out
+
+    def resampledTraces(self, Data, src_fs, tar_fs, method = 'linear'):
+
+        """
+        resampledTraces(Data, src_fs, tar_fs, method)
+        float32 traces resampled from src_fs to tar_fs, all traces at once, by
+        linear interpolation or, with method 'polyphase', by an anti-aliased
+        polyphase filter (scipy.signal.resample_poly).
+        """
 
-        if dim == 1:
+        if Data.ndim == 1:
             Data = Data.reshape(len(Data), 1)
-        
-        
+
         (ns, nt) = Data.shape
         dtp = np.float32
         signal_time_max = 1.0*(ns-1) / src_fs
-        tar_sample_max = np.int(signal_time_max*tar_fs)
-        output_signal = np.empty((tar_sample_max, nt), dtype = dtp)
+        tar_sample_max = int(signal_time_max*tar_fs)
 
-        for i in range(0, nt, 1):
-            
-            input_signal = Data[:, i]
-            signal_len = len(input_signal)
-            
-            signal_time_max = 1.0*(signal_len-1) / src_fs
-            src_time = 1.0 * np.linspace(0,signal_len,signal_len) / src_fs
-            tar_time = 1.0 * np.linspace(0,np.int(signal_time_max*tar_fs),np.int(signal_time_max*tar_fs)) / tar_fs
-            output_signal[:,i] = np.interp(tar_time,src_time,input_signal).astype(dtp)
+        if method == 'polyphase':
 
-        return output_signal
+            ratio = Fraction(tar_fs / src_fs).limit_denominator(1000)
+            output_signal = resample_poly(Data, ratio.numerator, ratio.denominator, axis = 0)
+
+            return output_signal[:tar_sample_max].astype(dtp)
+
+        # source sample positions of the target times, with the time axes of
+        # linspace(0, n, n) / fs on both sides
+        pos = np.linspace(0, tar_sample_max, tar_sample_max) / tar_fs * src_fs * (ns - 1) / ns
+        pos = np.clip(pos, 0, ns - 1)
+
+        i0 = np.minimum(pos.astype(np.int64), max(ns - 2, 0))
+        i1 = np.minimum(i0 + 1, ns - 1)
+        w = (pos - i0)[:, np.newaxis]
+
+        output_signal = Data[i0] * (1 - w) + Data[i1] * w
+
+        return output_signal.astype(dtp)
 
 
-    
     def pArrivals(self):
         return self.pPicks
 
     def sArrivals(self):
         return self.sPicks
 
-    def pickPS(self, nsta, nlta , p_thres, s_thres, method):
-        
-        p_cfs, s_cfs = self.calcStaLtaCF(nsta, nlta, method)
-        
-        from ..psmodule.pspicker import trigger_onset
+    def pickPS(self, nsta, nlta , p_thres, s_thres, method = 'recursive_sta_lta', workers = None):
 
-        count = 0
-        sPicks = {}
-        pPicks = {}
+        """
+        pickPS(nsta, nlta, p_thres, s_thres, method, workers)
+        Return the P and S picks of all traces as one PICK_DTYPE array (trace,
+        sample, phase 0 for P and 1 for S, cf), ordered by trace and sample.
+        trace is the index in traceData: P picks are on the vertical traces,
+        S picks on the horizontal trace of the receiver with the larger
+        function at the onset. The onsets are searched in a pool of workers
+        threads (default one per CPU).
+        P picks are also kept in pPicks, S picks in sPicks.
+        """
 
-        ns, ntr = p_cfs.shape
+        p_cfs = self._cfStaLta('p', 'z', nsta, nlta, method)
 
-        for i in range(ntr):
-            
-            p_on_off = trigger_onset(p_cfs[:,i], p_thres, p_thres)
-            if len(p_on_off):
-                pPicks[i] = p_on_off[:, 0]
-            else:
-                pPicks[i] = []
-                
+        self.pPicks = pickOnsets(p_cfs, p_thres, p_thres, 0, workers)
+        self.pPicks['trace'] = self.getComponentTraceIndex('z')[self.pPicks['trace']]
 
-            s_on_off = trigger_onset(s_cfs[:,i], s_thres, s_thres)
-            if len(s_on_off):
-                sPicks[i] = s_on_off[:, 0]
-            else:
-                sPicks[i] = []
+        if self.componentFlag == 1:
+
+            self.sPicks = pickOnsets(p_cfs, s_thres, s_thres, 1, workers)
+
+        else:
+
+            e_cfs = self._cfStaLta('s', 'e', nsta, nlta, method)
+            n_cfs = self._cfStaLta('s', 'n', nsta, nlta, method)
+
+            self.sPicks = pickOnsets(np.maximum(e_cfs, n_cfs), s_thres, s_thres, 1, workers)
+
+            column = self.sPicks['trace']
+            sample = self.sPicks['sample']
+            east = e_cfs[sample, column] >= n_cfs[sample, column]
+
+            self.sPicks['trace'] = np.where(east, self.getComponentTraceIndex('x')[column],
+                                            self.getComponentTraceIndex('y')[column])
+
+        picks = np.concatenate([self.pPicks, self.sPicks])
+
+        return picks[np.lexsort((picks['sample'], picks['trace']))]
+
+    def calcStaLtaCF(self, nsta = 30, nlta = 80, method = 'recursive_sta_lta'):
+
+        """
+        p_cfs, s_cfs = calcStaLtaCF(nsta, nlta, method)
+        STA/LTA characteristic functions for P picking, on the vertical
+        component, and for S picking, the larger of both horizontal ones.
+        Single component data gives the same function for both.
+        """
+
+        p_cfs = self._cfStaLta('p', 'z', nsta, nlta, method)
+
+        if self.componentFlag == 1:
+
+            return p_cfs, p_cfs
+
+        s_cfs = np.maximum(self._cfStaLta('s', 'e', nsta, nlta, method),
+                           self._cfStaLta('s', 'n', nsta, nlta, method))
+
+        return p_cfs, s_cfs
 
-        return pPicks, sPicks
-        
 
     def calcStaLta(self, traceData, nsta = 30, nlta = 80, method = 'classic_sta_lta', mode = 'continuous'):
 
-        NS, NTR = traceData.shape   
+        """
+        calcStaLta(traceData, nsta, nlta, method, mode)
+        STA/LTA of all the traces of traceData at once. With mode 'continuous'
+        the traces are taken end to end as one record.
+        """
+
+        NS, NTR = traceData.shape
 
         if mode == 'continuous':
 
             traceData = traceData.reshape(-1,1, order = 'F')
 
-        ns, ntr = traceData.shape
-        cfs = np.zeros((ns, ntr), dtype=np.float32) 
-            
-        if method == 'classic_sta_lta':
-            
-            for i in range(ntr):
-                trace = traceData[:, i]                             
-                cf = classic_sta_lta(trace, nsta, nlta)
-                cfs[:,i] = cf
-
-        elif method == 'delayed_sta_lta':
-            for i in range(ntr):
-                trace = traceData[:, i]                             
-                cf = delayed_sta_lta(trace, nsta, nlta)
-                cfs[:,i] = cf
-            
-        elif method == 'recursive_sta_lta':
-            for i in range(ntr):
-                trace = traceData[:, i]     
-                cf = recursive_sta_lta(trace, nsta, nlta)
-                cfs[:,i] = cf  
+        cfs = STA_LTA_METHODS[method](traceData, nsta, nlta).astype(np.float32)
 
         if mode == 'continuous':
             cfs = cfs.reshape(NS, NTR, order = 'F')
@@ -2246,68 +2772,25 @@ class Segy:
 
 
     def _cfStaLta(self, phase = 'p', component = 'z', nsta = 30, nlta = 80, method = 'recursive_sta_lta'):
-        
-        ns, ntr = self.traceData.shape
-        if self.componentFlag == 1:
-            cfs = np.empty((ns, ntr), dtype=np.float32)            
-            
-            if method == 'classic_sta_lta':
-                for i in range(ntr):
-                    trace = self.traceData[:, i]                             
-                    cf = classic_sta_lta(trace, nsta, nlta)
-                    cfs[:,i] = cf
-
-            elif method == 'delayed_sta_lta':
-                for i in range(ntr):
-                    trace = self.traceData[:, i]                             
-                    cf = delayed_sta_lta(trace, nsta, nlta)
-                    cfs[:,i] = cf
-                
-            elif method == 'recursive_sta_lta':
-                for i in range(ntr):
-                    trace = self.traceData[:, i]     
-                    cf = recursive_sta_lta(trace, nsta, nlta)
-                    cfs[:,i] = cf          
-               
 
-        else:
-            cfs = np.empty((ns, int(ntr/3)), dtype=np.float32)
-            
-            if phase == 'p':
+        if self.componentFlag == 1:
 
-                traceData = self.zTraces
+            traceData = self.traceData
 
-            else:
+        elif phase == 'p':
 
-                if component == 'e':
-                    traceData = self.xTraces
-                else:
-                    traceData = self.yTraces
+            traceData = self.zTraces
 
+        elif component == 'e':
 
-            if method == 'classic_sta_lta':   
+            traceData = self.xTraces
 
-                trace = traceData[:, i]             
-                cf = classic_sta_lta(trace, nsta, nlta)
-                cfs[:,i] = cf 
+        else:
 
-            elif  method == 'delayed_sta_lta':
-                
-                trace = traceData[:, i]            
-                cf = delayed_sta_lta(trace, nsta, nlta)
-                cfs[:,i] = cf 
-                
-            elif  method == 'recursive_sta_lta':
-                trace = traceData[:, i]            
-                cf = recursive_sta_lta(trace, nsta, nlta)
-                cfs[:,i] = cf 
-                              
+            traceData = self.yTraces
 
+        return STA_LTA_METHODS[method](traceData, nsta, nlta).astype(np.float32)
 
-        return cfs
-
-    
-    
 
     def imagePlot(self, Data, SH = None):
         if SH == None:
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Directory layouts of recorder .dat files.
+
+A layout is a path pattern relative to the input root, with '/' between levels
+and fields in braces, for instance
+
+    {rcv}/{ymd}/{hh}/{mm}T.dat          receiver folders holding day/hour folders
+    {ts:%Y%m%d%H%M}/{rcv}.dat           one folder per minute holding all receivers
+
+Fields:
+    {rcv}       receiver name (digits)
+    {ymd}       date as YYYYMMDD
+    {hh} {mm} {ss}
+                hour, minute and second as two digits
+    {ts:fmt}    date and time in strftime format fmt (%Y %y %m %d %j %H %M %S)
+    *           any text
+
+The tree is walked once, level by level, and only entries matching the
+pattern are visited; the timestamp of each file is derived from its path.
+"""
+
+import os
+import re
+import datetime
+
+from .utils import transform_separator
+
+
+DEFAULT_LAYOUT = '{rcv}/{ymd}/{hh}/{mm}T.dat'
+
+TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+
+FIELD_PATTERNS = {'rcv': r'\d+',
+                  'ymd': r'\d{8}',
+                  'hh': r'\d{2}',
+                  'mm': r'\d{2}',
+                  'ss': r'\d{2}'}
+
+STRFTIME_PATTERNS = {'Y': r'\d{4}',
+                     'y': r'\d{2}',
+                     'm': r'\d{2}',
+                     'd': r'\d{2}',
+                     'j': r'\d{3}',
+                     'H': r'\d{2}',
+                     'M': r'\d{2}',
+                     'S': r'\d{2}',
+                     '%': '%'}
+
+TOKEN = re.compile(r'\{(\w+)(?::([^}]*))?\}|\*')
+
+
+def _compile_level(level):
+    """
+    Regular expression of one path level of a layout pattern.
+    """
+
+    regex = ''
+    pos = 0
+
+    for token in TOKEN.finditer(level):
+
+        regex += re.escape(level[pos:token.start()])
+        pos = token.end()
+
+        name, fmt = token.group(1), token.group(2)
+
+        if token.group(0) == '*':
+            regex += '.*?'
+
+        elif name == 'ts':
+            if not fmt:
+                raise ValueError("Layout field {ts} needs a strftime format, e.g. {ts:%Y%m%d%H%M}")
+            ts = re.sub(r'%(.)', lambda m: STRFTIME_PATTERNS[m.group(1)] if m.group(1) in STRFTIME_PATTERNS
+                        else re.escape(m.group(0)), fmt)
+            regex += '(?P<ts>' + ts + ')'
+
+        elif name in FIELD_PATTERNS:
+            regex += '(?P<' + name + '>' + FIELD_PATTERNS[name] + ')'
+
+        else:
+            raise ValueError("Unknown layout field {" + name + "}")
+
+    regex += re.escape(level[pos:])
+
+    return re.compile('^' + regex + '$')
+
+
+class DirectoryLayout:
+
+    """
+    Path pattern of the .dat files below an input root, see the module docstring.
+    """
+
+    def __init__(self, pattern = DEFAULT_LAYOUT):
+
+        self.pattern = transform_separator(pattern).strip('/')
+
+        levels = self.pattern.split('/')
+
+        self.levels = [_compile_level(level) for level in levels]
+
+        fields = set()
+        for level in self.levels:
+            fields.update(level.groupindex)
+
+        self.tsFormat = None
+        for level in levels:
+            for token in TOKEN.finditer(level):
+                if token.group(1) == 'ts':
+                    self.tsFormat = token.group(2)
+
+        if 'rcv' not in fields:
+            raise ValueError("Layout " + pattern + " has no {rcv} field")
+
+        if 'ts' not in fields and not {'ymd', 'hh', 'mm'} <= fields:
+            raise ValueError("Layout " + pattern + " needs {ts:...} or {ymd}, {hh} and {mm} fields")
+
+    def timestamp(self, fields):
+
+        """
+        Return the datetime of a file from the fields matched in its path.
+        """
+
+        if 'ts' in fields:
+            ts = datetime.datetime.strptime(fields['ts'], self.tsFormat)
+        else:
+            ts = datetime.datetime.strptime(fields['ymd'] + fields['hh'] + fields['mm'], '%Y%m%d%H%M')
+
+        if 'ss' in fields:
+            ts = ts.replace(second = int(fields['ss']))
+
+        return ts
+
+    def scan(self, root):
+
+        """
+        Walk root once and yield (rcv, datetime, path, size, mtime_ns) for every matching file.
+        Entries are visited in sorted order at each level.
+        """
+
+        stack = [(root, 0, {})]
+
+        while stack:
+
+            folder, depth, fields = stack.pop()
+
+            try:
+                entries = sorted(os.scandir(folder), key = lambda e: e.name)
+            except OSError:
+                continue
+
+            last = depth == len(self.levels) - 1
+
+            subfolders = []
+
+            for entry in entries:
+
+                match = self.levels[depth].match(entry.name)
+
+                if match is None:
+                    continue
+
+                # the same field in several levels must agree, e.g. {ymd} twice
+                found = dict(fields)
+                if any(found.get(k, v) != v for k, v in match.groupdict().items()):
+                    continue
+                found.update(match.groupdict())
+
+                if last:
+
+                    if not entry.is_file():
+                        continue
+
+                    try:
+                        ts = self.timestamp(found)
+                    except ValueError:
+                        continue
+
+                    stat = entry.stat()
+
+                    yield found['rcv'], ts, transform_separator(entry.path), stat.st_size, stat.st_mtime_ns
+
+                elif entry.is_dir():
+
+                    subfolders.append((entry.path, depth + 1, found))
+
+            # pushed in reverse so that folders are walked in sorted order
+            stack.extend(reversed(subfolders))
+
+    def index(self, root):
+
+        """
+        Return {timestamp: [(rcv, path, size, mtime_ns), ...]} for the files below root,
+        timestamps formatted as 'YYYYMMDD_HHMMSS'.
+        """
+
+        index = {}
+
+        for rcv, ts, path, size, mtime in self.scan(root):
+
+            index.setdefault(ts.strftime(TIMESTAMP_FORMAT), []).append((rcv, path, size, mtime))
+
+        return index
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Conversion manifest kept in the output directory.
+
+The manifest is an append-only JSON-lines file with one record per state change
+of an output file:
+
+    {"output": "20191111_000000.sgy", "state": "started",
+     "inputs": [[path, size, mtime_ns], ...]}
+    {"output": "20191111_000000.sgy", "state": "done",
+     "inputs": [...], "ntraces": 180, "size": 43646400}
+
+Outputs written in another sample format than the default carry it in a
+"format" field.
+
+The last record of an output wins. An output is complete when its last record
+is 'done', its input fingerprints and format are unchanged and the file on
+disk still has the recorded size; anything else is converted again.
+"""
+
+import os
+import json
+
+
+MANIFEST_NAME = '.dat2segy-manifest.jsonl'
+
+
+class ConversionManifest:
+
+    """
+    Completion state of the SEG-Y files of an output directory.
+    """
+
+    def __init__(self, outpath):
+
+        self.path = os.path.join(outpath, MANIFEST_NAME)
+        self.records = {}
+
+        if os.path.exists(self.path):
+
+            with open(self.path, 'r') as f:
+
+                for line in f:
+
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # torn last line of an interrupted run
+                        continue
+
+                    self.records[record['output']] = record
+
+        self._f = None
+
+    def __contains__(self, name):
+
+        return name in self.records
+
+    def isComplete(self, name, inputs, size, fmt = None):
+
+        """
+        True if output name was completed from the same inputs in the format fmt
+        and still has the recorded size; size is the current file size or None
+        if missing.
+        """
+
+        record = self.records.get(name)
+
+        if record is None or record['state'] != 'done':
+            return False
+
+        return record['inputs'] == inputs and record['size'] == size and record.get('format') == fmt
+
+    def start(self, name, inputs, fmt = None):
+
+        self._append(self._record({'output': name, 'state': 'started', 'inputs': inputs}, fmt))
+
+    def finish(self, name, inputs, ntraces, size, fmt = None):
+
+        self._append(self._record({'output': name, 'state': 'done', 'inputs': inputs,
+                                   'ntraces': int(ntraces), 'size': int(size)}, fmt))
+
+    @staticmethod
+    def _record(record, fmt):
+
+        if fmt is not None:
+            record['format'] = fmt
+
+        return record
+
+    def close(self):
+
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def _append(self, record):
+
+        if self._f is None:
+            self._f = open(self.path, 'a')
+
+        self._f.write(json.dumps(record) + '\n')
+        self._f.flush()
+
+        self.records[record['output']] = record